@@ -173,6 +173,18 @@ class ChatRobot(QObject):
         """处理流式内容的回调函数"""
         if HAS_PYSIDE:
             self.stream_content.emit(content)
+
+    def _progress_callback(self, content):
+        """插件执行进度的回调函数"""
+        if HAS_PYSIDE:
+            self.response_ready.emit(content)
+        else:
+            print(content)
+
+    def cancel_plugin(self):
+        """请求取消当前正在执行的插件（插件需要支持取消）"""
+        if self.current_plugin:
+            self.current_plugin.cancel()
     
     # 主框架
     def ChatFrame(self, question):
@@ -212,6 +224,7 @@ class ChatRobot(QObject):
                 
             # 查找并执行插件
             plugin_callable = self.current_plugin.execute
+            self.current_plugin.progress_callback = self._progress_callback
             
             # 通知GUI插件开始处理
             if HAS_PYSIDE:
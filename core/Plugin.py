@@ -3,6 +3,7 @@ from typing import Dict, Any, Callable, List
 import json
 import os
 import inspect
+import threading
 
 class Plugin:
     """参数解释：\n
@@ -15,6 +16,7 @@ class Plugin:
     - parameters: List[Dict[str, Any]] 参数列表\n
     - execute: Callable[[Dict[str, Any]], Any] 执行函数\n
     - result: Any 执行结果\n
+    - progress_callback: Callable[[str], Any] 执行进度的回调函数（由ChatRobot设置）\n
     """
     def __init__(self, plugin_name: str, description: str = "", parameters: List[Dict[str, Any]] = []):
 
@@ -27,6 +29,8 @@ class Plugin:
         self.parameters = parameters
         self.execute = None
         self.results = None
+        self.progress_callback: Callable[[str], Any] = None
+        self._cancel_event = threading.Event()
         
     @classmethod
     def get_class_name(cls)->str:
@@ -88,3 +92,18 @@ class Plugin:
     def refresh(self):
         """刷新插件的执行结果"""
         self.results = None
+
+    def report_progress(self, message: str):
+        """向调用方报告执行进度，未设置回调时打印到控制台"""
+        if self.progress_callback:
+            self.progress_callback(message)
+        else:
+            print(message)
+
+    def cancel(self):
+        """请求取消正在执行的插件，由支持取消的插件在执行过程中检查 is_cancelled"""
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
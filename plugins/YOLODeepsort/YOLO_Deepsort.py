@@ -7,158 +7,186 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 # 将modules和脚本所在目录路径添加到sys.path
 sys.path.append(current_dir)
 import numpy as np
-import objtracker
-from objdetector import Detector
 import cv2
 import time
+from core.Plugin import Plugin
+from video_io import FrameReader, FrameWriter
+from trails import TrailBuffer
 
 
 RESULT_PATH = './results\\Track_results\\result.mp4'
 TRA_WEI_PATH = './weights/YOLOv8\yolov8x_UAV.pt' # 默认的图像跟踪类任务的权重路径
 
-class Point:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-class Detections:
-    def __init__(self):
-        self.detections = []
-
-    def add(self, xyxy, confidence, class_id, tracker_id):
-        self.detections.append((xyxy, confidence, class_id, tracker_id))
-
-def draw_trail(output_image_frame, trail_points, trail_color, trail_length=50):
-    for i in range(len(trail_points)):
-        if len(trail_points[i]) > 1:
-            for j in range(1, len(trail_points[i])):
-                cv2.line(output_image_frame, (int(trail_points[i][j-1][0]), int(trail_points[i][j-1][1])),
-                         (int(trail_points[i][j][0]), int(trail_points[i][j][1])), trail_color[i], thickness=2)
-        if len(trail_points[i]) > trail_length:
-            trail_points[i].pop(0)  # Remove the oldest point from the trail
-
-
-class PedCarTrackTask(Task):
+class PedCarTrackPlugin(Plugin):
+    """
+    行人车辆的视频跟踪插件实现。\n
+    track_stream() 逐帧产出跟踪结果，execute 消费该生成器并把汇总的轨迹信息返回给大模型。\n
     """
-    行人车辆的跟踪任务实现。\n
-    参数：{'image_path': str, 'weight_path': str (可选), 'save_path': str (可选)}\n"""
     def __init__(self):
         super().__init__('PedCarTrack',
-                         [{'name': 'image_path', 'description': '待检测的图像路径', 'required': True},
-                          {'name': 'weight_path', 'description': 'YOLO权重路径', 'required': False},
-                          {'name': 'save_path', 'description': '保存路径', 'required': False}],
-                         "使用YOLO进行行人车辆跟踪。")
-        self.calltask = self.PedCarTrack
-        
-    def PedCarTrack(params):
+                         "使用YOLO和DeepSort对视频中的行人和车辆进行跟踪，统计出现的目标数量和轨迹。",
+                         [{'name': 'video_path', 'description': '待跟踪的视频路径（或摄像头编号）', 'required': True},
+                          {'name': 'weight_path', 'description': 'YOLO权重路径', 'required': False, 'default': TRA_WEI_PATH},
+                          {'name': 'is_show', 'description': '是否实时显示跟踪结果', 'required': False, 'default': False},
+                          {'name': 'save_path', 'description': '跟踪结果视频的保存路径', 'required': False, 'default': RESULT_PATH},
+                          {'name': 'max_frames', 'description': '最多处理的帧数', 'required': False},
+                          {'name': 'detect_stride', 'description': "每隔几帧运行一次检测，'auto'为按目标运动自适应", 'required': False, 'default': 1},
+                          {'name': 'target_fps', 'description': '目标处理帧率，自适应检测间隔时不低于该帧率', 'required': False}])
+        self.execute = self.pedCarTrack
+        self.results:list[str] = [] # 存储结果视频最后一帧截图的路径
+        self._detector = None # 按权重路径缓存的检测器，重复任务不重新加载
+        self._weight_path = None
+        self.source_fps = 25 # 当前视频源的帧率，track_stream 打开视频后更新
+
+    def _get_detector(self, weight_path):
+        from objdetector import Detector
+        if self._detector is None or self._weight_path != weight_path:
+            self._detector = Detector(weight_path)
+            self._weight_path = weight_path
+        return self._detector
+
+    @staticmethod
+    def _parse_flag(value):
+        """大模型给出的参数可能是字符串，'false'、'0' 等按 False 处理"""
+        return str(value).strip().lower() in ('1', 'true', 'yes')
+
+    @staticmethod
+    def _parse_path(value):
+        """路径参数为空或为 'false'、'none' 等时返回 None"""
+        if value is None or str(value).strip().lower() in ('', '0', 'false', 'no', 'none', 'null'):
+            return None
+        return str(value)
+
+    @staticmethod
+    def _make_stride(params, objtracker):
+        """detect_stride 为整数时固定间隔，为'auto'或给出 target_fps 时自适应；每帧都检测时返回 None"""
+        detect_stride = str(params.get('detect_stride', 1)).strip().lower()
+        target_fps = params.get('target_fps')
+        target_fps = float(target_fps) if target_fps else None
+        if detect_stride == 'auto' or target_fps:
+            return objtracker.AdaptiveStride(target_fps=target_fps)
+        if int(detect_stride) > 1:
+            return objtracker.AdaptiveStride(int(detect_stride), int(detect_stride))
+        return None
+
+    def track_stream(self, params):
         """
-        行人车辆的跟踪任务实现。\n
-        参数：{'image_path': str, 'weight_path': str (可选), 'save_path': str (可选)}\n
+        逐帧跟踪的生成器，每帧产出 {'frame': 帧号, 'image': 绘制后的图像, 'tracks': [(x1, y1, x2, y2, cls, track_id), ...]}。\n
+        解码和编码（params 中给出 save_path 时）在后台线程中进行，与检测跟踪重叠；
+        image 位于解码的环形缓冲区中，只在下一次迭代前有效，需要保留时请复制。\n
+        每秒通过 report_progress 报告一次已处理帧数和FPS；调用 cancel() 后在下一帧停止。\n
+        params 中 render 为 False 时不绘制框和轨迹，image 为原始帧（只需要跟踪结果时）。
         """
-        image_path = params['image_path']
-        weight_path = params.get('weight_path', TRA_WEI_PATH)
-        save_path = params.get('save_path', RESULT_PATH)
-        
-        video_capture = cv2.VideoCapture(image_path)
-        
-        if not video_capture.isOpened():
-            print("Error opening video file.")
-            exit()
-
-        # Get video properties (width and height)
-        width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        # Close the video capture
-        video_capture.release()
-
-        detector = Detector(weight_path)
-        video_capture = cv2.VideoCapture(image_path)
-        videoWriter = None
-        fps = int(video_capture.get(5))
-        # print('fps:', fps)
-
-        # Dictionary to store the trail points of each object
-        object_trails = {}
-        
-        start_time = time.time()
-        print("正在处理文件，已经弹出实时追踪的窗口")
-        while True:
-            _, im = video_capture.read()
-            if im is None:
-                break
-
-            detections = Detections()
-            output_image_frame, list_bboxs = objtracker.update(detector, im)
-
-            for item_bbox in list_bboxs:
-                x1, y1, x2, y2, _, track_id = item_bbox
-                detections.add((x1, y1, x2, y2), None, None, track_id)
-
-            # Add the current object's position to the trail
-            for xyxy, _, _, track_id in detections.detections:
-                x1, y1, x2, y2 = xyxy
-                center = Point(x=(x1+x2)/2, y=(y1+y2)/2)
-                if track_id in object_trails:
-                    object_trails[track_id].append((center.x, center.y))
+        import objtracker
+
+        source = params['video_path']
+        source = int(source) if str(source).isdigit() else source
+        max_frames = params.get('max_frames')
+        max_frames = int(max_frames) if max_frames else None
+        stride = self._make_stride(params, objtracker)
+        render = self._parse_flag(params.get('render', True))
+
+        save_path = self._parse_path(params.get('save_path'))
+        reader = FrameReader(source)
+        self.source_fps = reader.fps
+        writer = None
+        detector = self._get_detector(params.get('weight_path', TRA_WEI_PATH))
+        objtracker.reset_deepsort() # 新任务从空的跟踪状态开始，不重新加载权重
+        self._cancel_event.clear()
+
+        # 每个目标最近27帧的中心点轨迹
+        trails = TrailBuffer(length=27)
+        frame_idx = 0
+        start_time = last_report = time.time()
+        try:
+            for im in reader:
+                if self.is_cancelled or (max_frames is not None and frame_idx >= max_frames):
+                    break
+
+                if stride is None:
+                    output_image_frame, list_bboxs = objtracker.update(detector, im, render)
                 else:
-                    object_trails[track_id] = [(center.x, center.y)]
-
-            # Draw the trail for each object
-            trail_colors = [(255, 0, 255)] * len(object_trails)  # Red color for all trails
-            draw_trail(output_image_frame, list(object_trails.values()), trail_colors, trail_length=27)
-
-            # Remove trails of objects that are not detected in the current frame
-            for tracker_id in list(object_trails.keys()):
-                if tracker_id not in [item[3] for item in detections.detections]:
-                    object_trails.pop(tracker_id)
-            
-            if videoWriter is None:
-                fourcc = cv2.VideoWriter_fourcc(
-                    'm', 'p', '4', 'v')  # opencv3.0
-                videoWriter = cv2.VideoWriter(
-                    save_path, fourcc, fps, (output_image_frame.shape[1], output_image_frame.shape[0]))
-
-            videoWriter.write(output_image_frame)
-            cv2.imshow('Demo', output_image_frame)
-            cv2.waitKey(1)
-
-        video_capture.release()
-        videoWriter.release()
-        cv2.destroyAllWindows()
-        spend_time = time.time() - start_time
-        print("处理完成")
-        print(f'处理耗时: {spend_time}s')
-        
-        return f"已经实时显示追踪结果于屏幕上，结果文件保存在{save_path}"
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+                    output_image_frame, list_bboxs = objtracker.update_adaptive(detector, im, stride, render=render)
 
+                trails.update(list_bboxs)
+                if render:
+                    trails.draw(output_image_frame)
 
+                yield {'frame': frame_idx, 'image': output_image_frame, 'tracks': list_bboxs}
+                frame_idx += 1
 
+                # 调用方处理完本帧后再交给编码线程，编码完成后才归还解码缓冲区；编码与下一帧的检测跟踪重叠
+                if save_path:
+                    if writer is None:
+                        writer = FrameWriter(save_path, self.source_fps,
+                                             (output_image_frame.shape[1], output_image_frame.shape[0]))
+                    writer.write(output_image_frame, done=reader.release)
+                else:
+                    reader.release()
+
+                now = time.time()
+                if now - last_report >= 1.0:
+                    last_report = now
+                    self.report_progress(f"正在跟踪：已处理 {frame_idx} 帧，{frame_idx / (now - start_time):.1f} FPS")
+        finally:
+            if writer is not None:
+                writer.close()
+            reader.close()
+
+    def pedCarTrack(self, params):
+        """
+        行人车辆的跟踪任务实现。\n
+        参数：\n
+        'video_path':str (必选)\n
+        'weight_path':str (可选)\n
+        'is_show':bool (可选)\n
+        'save_path':str (可选)\n
+        'max_frames':int (可选)\n
+        'detect_stride':int|'auto' (可选)\n
+        'target_fps':float (可选)\n
+        """
+        self.results.clear()
+        params = dict(params)
+        save_path = params['save_path'] = self._parse_path(params.get('save_path', RESULT_PATH))
+        is_show = self._parse_flag(params.get('is_show', False))
+        params['render'] = bool(save_path or is_show) # 既不保存也不显示时跳过绘制
+
+        last_frame = None
+        tracks = {} # track_id -> [首次出现的帧, 最后出现的帧, 出现的帧数]
+        start_time = time.time()
+        frame_count = 0
+        for result in self.track_stream(params):
+            frame_count += 1
+            if save_path:
+                if last_frame is None:
+                    last_frame = np.empty_like(result['image'])
+                np.copyto(last_frame, result['image']) # 缓冲区会被复用，保留最后一帧用于截图
+            for _, _, _, _, _, track_id in result['tracks']:
+                track = tracks.setdefault(int(track_id), [result['frame'], result['frame'], 0])
+                track[1] = result['frame']
+                track[2] += 1
+
+            if is_show:
+                cv2.imshow('Demo', result['image'])
+                cv2.waitKey(1)
+
+        if is_show:
+            cv2.destroyAllWindows()
+        spend_time = time.time() - start_time
+        if save_path and last_frame is not None:
+            snapshot_path = os.path.splitext(save_path)[0] + '_last.jpg'
+            cv2.imwrite(snapshot_path, last_frame)
+            self.results.append(snapshot_path)
+
+        # 汇总轨迹信息返回给大模型
+        summary = [f"在{params['video_path']}上共处理 {frame_count} 帧，耗时 {spend_time:.1f}s"
+                   f"（{frame_count / max(spend_time, 1e-6):.1f} FPS）" + ("，任务已被取消" if self.is_cancelled else "")]
+        summary.append(f"共跟踪到 {len(tracks)} 个不同的行人或车辆目标")
+        if tracks:
+            durations = np.array([track[2] for track in tracks.values()])
+            summary.append(f"每个目标平均出现 {durations.mean() / self.source_fps:.1f}s，最长 {durations.max() / self.source_fps:.1f}s")
+            for track_id, (first, last, count) in sorted(tracks.items(), key=lambda item: -item[1][2])[:10]:
+                summary.append(f"目标 {track_id}：第 {first} 帧至第 {last} 帧，出现 {count} 帧")
+        if save_path and frame_count:
+            summary.append(f"跟踪结果视频保存在{save_path}")
+        return '\n'.join(summary)
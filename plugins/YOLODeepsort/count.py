@@ -1,78 +1,124 @@
+from collections import namedtuple
 import numpy as np
-import objtracker
-from objdetector import Detector
 import cv2
+from trails import TrailBuffer
 
 VIDEO_PATH = './video/test_person.mp4'
 
-class Point:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-class Detections:
-    def __init__(self):
-        self.detections = []
-
-    def add(self, xyxy, confidence, class_id, tracker_id):
-        self.detections.append((xyxy, confidence, class_id, tracker_id))
-
-def draw_trail(output_image_frame, trail_points, trail_color, trail_length=50):
-    for i in range(len(trail_points)):
-        if len(trail_points[i]) > 1:
-            for j in range(1, len(trail_points[i])):
-                cv2.line(output_image_frame, (int(trail_points[i][j-1][0]), int(trail_points[i][j-1][1])),
-                         (int(trail_points[i][j][0]), int(trail_points[i][j][1])), trail_color[i], thickness=3)
-        if len(trail_points[i]) > trail_length:
-            trail_points[i].pop(0)  # Remove the oldest point from the trail
-
-def is_in_line(pt1, pt2, pt):
-    x1, y1 = pt1.x, pt1.y
-    x2, y2 = pt2.x, pt2.y
-    x, y = pt.x, pt.y
-    return np.sign((x2 - x1) * (y - y1) - (y2 - y1) * (x - x1))
-
-def trigger(detections: Detections, pt1, pt2, prev_tracker_state, tracker_state, crossing_ids, in_count, out_count):
-    for xyxy, _, _, tracker_id in detections.detections:
-        x1, y1, x2, y2 = xyxy
-        center = Point(x=(x1+x2)/2, y=(y1+y2)/2)
-        tracker_state_new = is_in_line(pt1, pt2, center) >= 0  # Use the center to determine the side
-
-        # Handle new detection
-        if tracker_id not in tracker_state or tracker_state[tracker_id] is None:
-            tracker_state[tracker_id] = {'state': tracker_state_new, 'direction': None}
-            if tracker_id in prev_tracker_state and prev_tracker_state[tracker_id] is not None:
-                # If the object was previously tracked and has a known direction,
-                # we restore its direction.
-                tracker_state[tracker_id]['direction'] = prev_tracker_state[tracker_id]['direction']
-
-        # Handle detection on the same side of the line
-        elif tracker_state[tracker_id]['state'] == tracker_state_new:
-            continue
-
-        # If the object has completely crossed the line
-        else:
-            if tracker_state[tracker_id]['state'] and not tracker_state_new:  # From up to down
-                if tracker_state[tracker_id]['direction'] != 'down':  # Only count if the previous direction was not 'down'
-                    in_count += 1  # Increment in_count for crossing from up to down
-                tracker_state[tracker_id]['direction'] = 'down'
-            elif not tracker_state[tracker_id]['state'] and tracker_state_new:  # From down to up
-                if tracker_state[tracker_id]['direction'] != 'up':  # Only count if the previous direction was not 'up'
-                    out_count += 1  # Increment out_count for crossing from down to up
-                tracker_state[tracker_id]['direction'] = 'up'
+CrossingEvent = namedtuple('CrossingEvent', ['frame', 'line', 'track_id', 'direction'])
 
-            tracker_state[tracker_id]['state'] = tracker_state_new  # Update the tracker state
 
-    # 更新已经消失的检测对象状态
-    for tracker_id in list(tracker_state.keys()):
-        if tracker_id not in [item[3] for item in detections.detections]:
-            prev_tracker_state[tracker_id] = tracker_state[tracker_id]  # Save the state of the disappeared object
-            tracker_state[tracker_id] = None
+class LineCounter(object):
+    """
+    多条计数线的越线计数器，每帧对所有目标中心与所有线一次性做向量化的侧别判断。\n
+    lines 为 [(pt1, pt2), ...] 或 {名称: (pt1, pt2)}，点为 (x, y)；目标中心在线段范围内从一侧到另一侧时计数：
+    从叉积 >= 0 的一侧到 < 0 的一侧记为'in'，反之记为'out'（pt1 在左、pt2 在右的水平线上，'in' 为向上穿越）。\n
+    每个目标每条线记录上一次的穿越方向，同一方向不重复计数；目标在某一帧消失后其侧别被清空，方向保留。\n
+    状态保存在以 track_id 为下标的数组中，track_id 应为非负整数。
+    """
+    _IN, _OUT = 1, -1
 
-    return in_count, out_count
+    def __init__(self, lines, capacity=256):
+        if isinstance(lines, dict):
+            self.names = list(lines.keys())
+            lines = list(lines.values())
+        else:
+            self.names = list(range(len(lines)))
+        segments = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        self._origin = segments[:, :2] # (L,2)
+        self._vector = segments[:, 2:] - segments[:, :2] # (L,2)
+        self._length2 = np.maximum((self._vector ** 2).sum(axis=1), 1e-12)
+        self._capacity = capacity
+        self.reset()
+
+    def reset(self):
+        num_lines = len(self._origin)
+        self._side = np.full((num_lines, self._capacity), -1, dtype=np.int8) # -1 未知，1 叉积>=0 的一侧，0 另一侧
+        self._direction = np.zeros((num_lines, self._capacity), dtype=np.int8) # 上一次的穿越方向
+        self._active = np.empty(0, dtype=np.int64) # 上一帧出现的 track_id
+        self._counts = np.zeros((num_lines, 2), dtype=np.int64) # 每条线的 [in, out]
+        self.frame_idx = 0
+
+    @property
+    def counts(self):
+        """{线名称: {'in': 数量, 'out': 数量}}"""
+        return {name: {'in': int(n_in), 'out': int(n_out)} for name, (n_in, n_out) in zip(self.names, self._counts)}
+
+    def _grow(self, max_id):
+        capacity = self._capacity
+        while capacity <= max_id:
+            capacity *= 2
+        pad = capacity - self._capacity
+        self._side = np.pad(self._side, ((0, 0), (0, pad)), constant_values=-1)
+        self._direction = np.pad(self._direction, ((0, 0), (0, pad)))
+        self._capacity = capacity
+
+    def update(self, tracks, frame_idx=None):
+        """
+        tracks 为跟踪结果 [(x1, y1, x2, y2, cls, track_id), ...] 或 (N,>=5) 数组（最后一列为 track_id）。\n
+        返回本帧的越线事件列表 [CrossingEvent(frame, line, track_id, direction), ...]
+        """
+        self.frame_idx = self.frame_idx + 1 if frame_idx is None else frame_idx
+        if len(tracks):
+            boxes = np.array([track[:4] for track in tracks], dtype=np.float64).reshape(-1, 4)
+            ids = np.array([track[-1] for track in tracks], dtype=np.int64)
+        else:
+            boxes, ids = np.empty((0, 4)), np.empty(0, dtype=np.int64)
+
+        # 上一帧出现、本帧消失的目标清空侧别
+        self._side[:, np.setdiff1d(self._active, ids, assume_unique=True)] = -1
+        self._active = ids
+        if not len(ids):
+            return []
+        if ids.max() >= self._capacity:
+            self._grow(ids.max())
+
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2 # (N,2)
+        offset = centers[None, :, :] - self._origin[:, None, :] # (L,N,2)
+        cross = self._vector[:, None, 0] * offset[..., 1] - self._vector[:, None, 1] * offset[..., 0]
+        along = (offset * self._vector[:, None, :]).sum(axis=2) / self._length2[:, None]
+        side = (cross >= 0).astype(np.int8) # (L,N)
+
+        prev = self._side[:, ids]
+        crossed = (prev >= 0) & (prev != side) & (along >= 0) & (along <= 1)
+        direction = np.where(prev == 1, self._IN, self._OUT).astype(np.int8)
+        counted = crossed & (self._direction[:, ids] != direction)
+        self._counts[:, 0] += (counted & (direction == self._IN)).sum(axis=1)
+        self._counts[:, 1] += (counted & (direction == self._OUT)).sum(axis=1)
+
+        line_idx, det_idx = np.nonzero(crossed)
+        self._direction[line_idx, ids[det_idx]] = direction[line_idx, det_idx]
+        self._side[:, ids] = side
+
+        line_idx, det_idx = np.nonzero(counted)
+        return [CrossingEvent(self.frame_idx, self.names[l], int(ids[d]), 'in' if direction[l, d] == self._IN else 'out')
+                for l, d in zip(line_idx, det_idx)]
+
+    def attach(self, stream):
+        """
+        包装逐帧产出 {'frame', 'tracks', ...} 的生成器（如 PedCarTrackPlugin.track_stream），
+        为每帧加上 'crossings'（本帧事件）和 'counts'（累计计数）后原样产出
+        """
+        for result in stream:
+            result['crossings'] = self.update(result['tracks'], result.get('frame'))
+            result['counts'] = self.counts
+            yield result
+
+    def draw(self, image, color=(0, 0, 255), thickness=2):
+        """在图像上画出计数线及其累计计数"""
+        for name, origin, vector, (n_in, n_out) in zip(self.names, self._origin, self._vector, self._counts):
+            pt1 = tuple(int(v) for v in origin)
+            pt2 = tuple(int(v) for v in origin + vector)
+            cv2.line(image, pt1, pt2, color, thickness=thickness)
+            cv2.putText(image, f'{name} in: {n_in} out: {n_out}', (pt1[0] + 10, pt1[1] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.75, color, thickness)
+        return image
 
 
 if __name__ == '__main__':
+    import objtracker
+    from objdetector import Detector
+
     # Initialize video capture to get video properties
     capture = cv2.VideoCapture(VIDEO_PATH)
     if not capture.isOpened():
@@ -86,62 +132,30 @@ if __name__ == '__main__':
     # Close the video capture
     capture.release()
 
-    # 例如 width = 1364 height = 768 pt1 = Point(0, 384) pt2 = Point(1364, 384)
-    pt1 = Point(0, height // 2)  # Line starting point at the center of the frame
-    pt2 = Point(width, height // 2)  # Line ending point at the center of the frame
-
-    in_count = 0
-    out_count = 0
-    in_count = 0
-    out_count = 0
-    prev_tracker_state = {}  # 用于记录上一帧的检测对象状态
-    tracker_state = {}
-    crossing_ids = set()  # 用于存储已经穿越线的检测对象的ID
+    # 例如 width = 1364 height = 768 计数线为 (0, 384) -> (1364, 384)
+    # Line across the center of the frame
+    counter = LineCounter({'center': ((0, height // 2), (width, height // 2))})
     detector = Detector()
     capture = cv2.VideoCapture(VIDEO_PATH)
 
-    # Dictionary to store the trail points of each object
-    object_trails = {}
+    # 每个目标最近50帧的中心点轨迹
+    trails = TrailBuffer(length=50, thickness=3)
 
     while True:
         _, im = capture.read()
         if im is None:
             break
 
-        detections = Detections()
         output_image_frame, list_bboxs = objtracker.update(detector, im)
-        cv2.line(output_image_frame, (pt1.x, pt1.y), (pt2.x, pt2.y), (0, 0, 255), thickness=2)
-
-        for item_bbox in list_bboxs:
-            x1, y1, x2, y2, _, track_id = item_bbox
-            detections.add((x1, y1, x2, y2), None, None, track_id)
-
-        # 使用trigger方法来计数穿越
-        in_count, out_count = trigger(detections, pt1, pt2, prev_tracker_state, tracker_state, crossing_ids, in_count, out_count)
-
-        # 更新上一帧的检测目标状态
-        prev_tracker_state = tracker_state.copy()
-
-        # 清空穿越线集合，准备下一帧的计数
-        crossing_ids.clear()
-
-        # Add the current object's position to the trail
-        for xyxy, _, _, track_id in detections.detections:
-            x1, y1, x2, y2 = xyxy
-            center = Point(x=(x1+x2)/2, y=(y1+y2)/2)
-            if track_id in object_trails:
-                object_trails[track_id].append((center.x, center.y))
-            else:
-                object_trails[track_id] = [(center.x, center.y)]
-
-        # Draw the trail for each object
-        trail_colors = [(255, 0, 255)] * len(object_trails)  # Red color for all trails
-        draw_trail(output_image_frame, list(object_trails.values()), trail_colors)
-
-        # Remove trails of objects that are not detected in the current frame
-        for tracker_id in list(object_trails.keys()):
-            if tracker_id not in [item[3] for item in detections.detections]:
-                object_trails.pop(tracker_id)
+
+        # 所有目标一次性判断越线
+        for event in counter.update(list_bboxs):
+            print(event)
+        in_count, out_count = counter.counts['center']['in'], counter.counts['center']['out']
+        cv2.line(output_image_frame, (0, height // 2), (width, height // 2), (0, 0, 255), thickness=2)
+
+        trails.update(list_bboxs)
+        trails.draw(output_image_frame)
 
         text_draw = 'DOWN: ' + str(out_count) + ' , UP: ' + str(in_count)
         output_image_frame = cv2.putText(img=output_image_frame, text=text_draw, org=(10, 50),
@@ -1,14 +1,25 @@
 from .deep_sort import DeepSort
 
 
-__all__ = ['DeepSort', 'build_tracker']
+__all__ = ['DeepSort', 'build_tracker', 'get_reid_model_path']
+
+
+def get_reid_model_path(cfg):
+    """按 REID_BACKEND 选择对应的ReID模型文件"""
+    backend = cfg.DEEPSORT.REID_BACKEND
+    if backend == 'torch':
+        return cfg.DEEPSORT.REID_CKPT
+    if backend == 'torch_int8':
+        return cfg.DEEPSORT.REID_INT8
+    return cfg.DEEPSORT.REID_ONNX
 
 
 def build_tracker(cfg, use_cuda):
-    return DeepSort(cfg.DEEPSORT.REID_CKPT, 
+    return DeepSort(get_reid_model_path(cfg), 
                 max_dist=cfg.DEEPSORT.MAX_DIST, min_confidence=cfg.DEEPSORT.MIN_CONFIDENCE, 
                 nms_max_overlap=cfg.DEEPSORT.NMS_MAX_OVERLAP, max_iou_distance=cfg.DEEPSORT.MAX_IOU_DISTANCE, 
-                max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET, use_cuda=use_cuda)
+                max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET, use_cuda=use_cuda,
+                reid_reuse_iou=cfg.DEEPSORT.REID_REUSE_IOU, reid_reuse_frames=cfg.DEEPSORT.REID_REUSE_FRAMES, reid_backend=cfg.DEEPSORT.REID_BACKEND)
     
 
 
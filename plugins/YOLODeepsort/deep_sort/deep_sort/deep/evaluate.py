@@ -12,4 +12,14 @@ top1correct = gl[res].eq(ql).sum().item()
 
 print("Acc top1:{:.3f}".format(top1correct/ql.size(0)))
 
+# mAP：按相似度对gallery排序后计算每个query的平均精度，分块计算以限制内存
+aps = []
+for start in range(0, ql.size(0), 256):
+    order = scores[start:start+256].argsort(dim=1, descending=True)
+    matches = gl[order].eq(ql[start:start+256].view(-1, 1)).float()
+    ranks = torch.arange(1, matches.size(1) + 1).float()
+    precision = matches.cumsum(dim=1) / ranks
+    aps.append((precision * matches).sum(dim=1) / matches.sum(dim=1).clamp(min=1))
+print("mAP:{:.3f}".format(torch.cat(aps).mean().item()))
+
 
@@ -0,0 +1,87 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from model import Net
+
+'''
+将 ReID 网络 Net(reid=True) 导出为 ONNX（batch 维度动态），
+并检查 onnxruntime / openvino 与 PyTorch 输出的一致性，可选地测试各后端在不同 batch 下的吞吐量。
+
+    python export_onnx.py --checkpoint checkpoint/ckpt.t7 --output checkpoint/ckpt.onnx --benchmark
+'''
+
+parser = argparse.ArgumentParser(description="Export the ReID net to ONNX")
+parser.add_argument("--checkpoint",default='./checkpoint/ckpt.t7',type=str)
+parser.add_argument("--output",default='./checkpoint/ckpt.onnx',type=str)
+parser.add_argument("--opset",default=18,type=int)
+parser.add_argument("--atol",default=1e-4,type=float)
+parser.add_argument("--benchmark",action="store_true")
+parser.add_argument("--batch-sizes",default='1,2,4,8,16,32,64,128',type=str)
+args = parser.parse_args()
+
+# net definition
+net = Net(reid=True)
+assert os.path.isfile(args.checkpoint), "Error: no checkpoint file found!"
+print('Loading from {}'.format(args.checkpoint))
+checkpoint = torch.load(args.checkpoint, map_location='cpu')
+net.load_state_dict(checkpoint['net_dict'])
+net.eval()
+
+# export
+dummy = torch.randn(1, 3, 128, 64)
+torch.onnx.export(net, dummy, args.output, opset_version=args.opset,
+                  input_names=['input'], output_names=['features'],
+                  dynamic_axes={'input': {0: 'batch'}, 'features': {0: 'batch'}})
+print('Exported to {}'.format(args.output))
+
+# backends
+runners = {}
+with torch.no_grad():
+    runners['torch'] = lambda x: net(torch.from_numpy(x)).numpy()
+try:
+    import onnxruntime as ort
+    session = ort.InferenceSession(args.output, providers=['CPUExecutionProvider'])
+    runners['onnxruntime'] = lambda x: session.run(None, {'input': x})[0]
+except ImportError:
+    print('onnxruntime not installed, skipped')
+try:
+    import openvino as ov
+    compiled = ov.Core().compile_model(args.output, 'CPU', {'INFERENCE_PRECISION_HINT': 'f32'})
+    runners['openvino'] = lambda x: compiled(x)[compiled.output(0)]
+except ImportError:
+    print('openvino not installed, skipped')
+
+# numerical parity against torch
+batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+rng = np.random.default_rng(0)
+with torch.no_grad():
+    for batch_size in batch_sizes:
+        x = rng.standard_normal((batch_size, 3, 128, 64), dtype=np.float32)
+        expected = runners['torch'](x)
+        for name, run in runners.items():
+            if name == 'torch':
+                continue
+            err = np.abs(run(x) - expected).max()
+            assert err < args.atol, "{} differs from torch by {:.2e} at batch {}".format(name, err, batch_size)
+print('Parity check passed for {} (atol={})'.format(', '.join(runners), args.atol))
+
+# throughput
+if args.benchmark:
+    torch.set_num_threads(os.cpu_count())
+    print('{:>6s}'.format('batch') + ''.join('{:>14s}'.format(name) for name in runners) + '   (crops/s)')
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            x = rng.standard_normal((batch_size, 3, 128, 64), dtype=np.float32)
+            row = []
+            for name, run in runners.items():
+                run(x)
+                repeat = max(3, 256 // batch_size)
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    run(x)
+                row.append(batch_size * repeat / (time.perf_counter() - start))
+            print('{:>6d}'.format(batch_size) + ''.join('{:>14.0f}'.format(v) for v in row))
@@ -1,5 +1,5 @@
 import torch
-import torchvision.transforms as transforms
+from torchvision.ops import roi_align
 import numpy as np
 import cv2
 import logging
@@ -12,49 +12,148 @@ from .model import Net
 供计算相似度时使用。
 
 模型训练是按照传统ReID的方法进行，使用Extractor类的时候输入为一个list的图片，得到图片对应的特征。
+
+推理后端可选：
+    torch        PyTorch Net，权重为 ckpt.t7
+    torch_int8   INT8 量化后的 TorchScript 模型（CPU），由 quantize.py 生成
+    onnxruntime  ONNX Runtime CPU，模型由 export_onnx.py 导出
+    openvino     OpenVINO CPU，直接读取同一个 ONNX 模型
 '''
 
+BACKENDS = ('torch', 'torch_int8', 'onnxruntime', 'openvino')
+
+
+class _OnnxRuntimeNet(object):
+    """以 ONNX Runtime 运行导出的 ReID 模型，接口与 Net 相同（输入输出均为 torch.Tensor）"""
+    def __init__(self, model_path):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, im_batch):
+        inputs = {self.input_name: im_batch.contiguous().numpy()}
+        return torch.from_numpy(self.session.run(None, inputs)[0])
+
+
+class _OpenVINONet(object):
+    """以 OpenVINO 运行导出的 ReID 模型，接口与 Net 相同（输入输出均为 torch.Tensor）"""
+    def __init__(self, model_path):
+        import openvino as ov
+        self.model = ov.Core().compile_model(model_path, 'CPU', {'INFERENCE_PRECISION_HINT': 'f32'})
+        self.output = self.model.output(0)
+
+    def __call__(self, im_batch):
+        return torch.from_numpy(self.model(im_batch.contiguous().numpy())[self.output])
+
+
 class Extractor(object):
-    def __init__(self, model_path, use_cuda=True):
-        self.net = Net(reid=True)
-        self.device = "cuda" if torch.cuda.is_available() and use_cuda else "cpu"
-        state_dict = torch.load(model_path, map_location=lambda storage, loc: storage)['net_dict']
-        self.net.load_state_dict(state_dict)
+    def __init__(self, model_path, use_cuda=True, backend='torch'):
+        if backend not in BACKENDS:
+            raise ValueError("Invalid backend; must be one of {}".format(BACKENDS))
+        self.backend = backend
+        if backend == 'torch':
+            self.net = Net(reid=True)
+            self.device = "cuda" if torch.cuda.is_available() and use_cuda else "cpu"
+            state_dict = torch.load(model_path, map_location=lambda storage, loc: storage)['net_dict']
+            self.net.load_state_dict(state_dict)
+            self.net.to(self.device)
+            self.net.eval() # 推理时BatchNorm使用训练得到的统计量，特征不随batch内其他框变化
+        elif backend == 'torch_int8':
+            # 量化算子只支持CPU
+            self.device = "cpu"
+            self.net = torch.jit.load(model_path, map_location='cpu')
+            self.net.eval()
+        else:
+            # onnxruntime/openvino 后端只在CPU上运行
+            self.device = "cpu"
+            self.net = _OnnxRuntimeNet(model_path) if backend == 'onnxruntime' else _OpenVINONet(model_path)
         logger = logging.getLogger("root.tracker")
-        logger.info("Loading weights from {}... Done!".format(model_path))
-        self.net.to(self.device)
+        logger.info("Loading weights from {} ({})... Done!".format(model_path, backend))
         self.size = (64, 128)
-        self.norm = transforms.Compose([
-            # RGB图片数据范围是[0-255]，需要先经过ToTensor除以255归一化到[0,1]之后，
-            # 再通过Normalize计算(x - mean)/std后，将数据归一化到[-1,1]。
-            transforms.ToTensor(),
-            # mean=[0.485, 0.456, 0.406] and std=[0.229, 0.224, 0.225]是从imagenet训练集中算出来的
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ])
-        
+        # RGB图片数据范围是[0-255]，先除以255归一化到[0,1]，再计算(x - mean)/std；
+        # mean=[0.485, 0.456, 0.406] and std=[0.229, 0.224, 0.225]是从imagenet训练集中算出来的。
+        # 两步合并为 x * scale + bias，在整个batch上一次完成
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        self._scale = (1. / (255. * std)).to(self.device)
+        self._bias = (-mean / std).to(self.device)
+        # 预分配的 uint8 缓冲区 (B, 128, 64, 3)，使用cuda时为锁页内存，按需扩容后复用
+        self._buffer = None
+
+    def _get_buffer(self, batch_size):
+        if self._buffer is None or len(self._buffer) < batch_size:
+            capacity = max(batch_size, 16 if self._buffer is None else 2 * len(self._buffer))
+            self._buffer = torch.empty((capacity, self.size[1], self.size[0], 3), dtype=torch.uint8,
+                                       pin_memory=self.device == "cuda")
+        return self._buffer[:batch_size]
+
+    def _normalize(self, im_batch):
+        """(B, 3, 128, 64) 的 uint8/float 张量 -> 归一化后的 float 张量"""
+        return im_batch.float().mul_(self._scale).add_(self._bias)
+
     def _preprocess(self, im_crops):
         """
-        TODO:
-            1. to float with scale from 0 to 1
-            2. resize to (64, 128) as Market1501 dataset did
-            3. concatenate to a numpy array
-            3. to torch Tensor
-            4. normalize
+        1. resize to (64, 128) as Market1501 dataset did, directly from uint8
+           into the preallocated buffer
+        2. copy the whole batch to the device at once
+        3. to float and normalize as one tensor op on the whole batch
+        """
+        buffer = self._get_buffer(len(im_crops))
+        host = buffer.numpy()
+        for i, im in enumerate(im_crops):
+            cv2.resize(im, self.size, dst=host[i])
+        im_batch = buffer.to(self.device, non_blocking=True).permute(0, 3, 1, 2)
+        return self._normalize(im_batch)
+
+    def _preprocess_frame(self, ori_img, bbox_xyxy):
+        """
+        ROI-align 方式：整帧上传一次，直接在帧张量上裁剪并缩放到 (128, 64)
+        bbox_xyxy: (N, 4) 像素坐标 [x1, y1, x2, y2)
         """
-        def _resize(im, size):
-            return cv2.resize(im.astype(np.float32)/255., size)
+        frame = torch.from_numpy(np.ascontiguousarray(ori_img)).to(self.device, non_blocking=True)
+        frame = frame.permute(2, 0, 1).unsqueeze(0).float()
+        boxes = torch.as_tensor(np.asarray(bbox_xyxy), dtype=torch.float32, device=self.device)
+        rois = torch.cat([torch.zeros((len(boxes), 1), device=self.device), boxes], dim=1)
+        im_batch = roi_align(frame, rois, output_size=(self.size[1], self.size[0]),
+                             spatial_scale=1.0, sampling_ratio=2, aligned=True)
+        return self._normalize(im_batch)
 
-        im_batch = torch.cat([self.norm(_resize(im, self.size)).unsqueeze(0) for im in im_crops], dim=0).float()
-        return im_batch
+    def _forward(self, im_batch):
+        with torch.no_grad():
+            features = self.net(im_batch)
+        return features.cpu().numpy()
+
+    def extract(self, ori_img, bbox_xyxy):
+        """从整帧图像中按 bbox_xyxy 提取特征。
+        使用cuda时走 ROI-align 路径，避免逐框抠图；cpu 上逐框缩放更快。
+        """
+        if self.device == "cuda":
+            return self._forward(self._preprocess_frame(ori_img, bbox_xyxy))
+        im_crops = [ori_img[y1:y2, x1:x2] for x1, y1, x2, y2 in bbox_xyxy]
+        return self(im_crops)
+
+    def extract_many(self, requests):
+        """
+        requests: [(ori_img, bbox_xyxy), ...]，可以来自不同的视频流。\n
+        所有帧的框合并为一个batch做一次前向，再按请求拆分返回特征列表。
+        """
+        sizes = [len(bbox_xyxy) for _, bbox_xyxy in requests]
+        if sum(sizes) == 0:
+            return [np.array([]) for _ in requests]
+        if self.device == "cuda":
+            im_batch = torch.cat([self._preprocess_frame(ori_img, bbox_xyxy)
+                                  for ori_img, bbox_xyxy in requests if len(bbox_xyxy)])
+        else:
+            im_batch = self._preprocess([ori_img[y1:y2, x1:x2] for ori_img, bbox_xyxy in requests
+                                         for x1, y1, x2, y2 in bbox_xyxy])
+        features = self._forward(im_batch)
+        return [chunk if len(chunk) else np.array([])
+                for chunk in np.split(features, np.cumsum(sizes)[:-1])]
 
 # __call__()是一个非常特殊的实例方法。该方法的功能类似于在类中重载 () 运算符，
 # 使得类实例对象可以像调用普通函数那样，以“对象名()”的形式使用。
     def __call__(self, im_crops):
-        im_batch = self._preprocess(im_crops)
-        with torch.no_grad():
-            im_batch = im_batch.to(self.device)
-            features = self.net(im_batch)
-        return features.cpu().numpy()
+        return self._forward(self._preprocess(im_crops))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+import argparse
+import os
+import time
+
+import torch
+import torchvision
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from model import Net
+
+'''
+ReID 网络 Net(reid=True) 的训练后静态 INT8 量化（FX graph mode，x86/fbgemm 后端）。
+校准数据使用 prepare_person.py / prepare_car.py 生成的 ImageFolder 目录（默认 data/train），
+量化后的模型以 TorchScript 保存，Extractor 以 backend='torch_int8' 加载。
+
+    python quantize.py --data-dir data --output checkpoint/ckpt_int8.pt --benchmark
+    python test.py --int8-model checkpoint/ckpt_int8.pt && python evaluate.py
+
+注：动态量化只作用于 nn.Linear，而 reid 模式下的前向只经过卷积部分，因此这里只做静态量化。
+'''
+
+parser = argparse.ArgumentParser(description="Post-training INT8 quantization of the ReID net")
+parser.add_argument("--data-dir",default='data',type=str)
+parser.add_argument("--calib-dir",default='train',type=str)
+parser.add_argument("--checkpoint",default='./checkpoint/ckpt.t7',type=str)
+parser.add_argument("--output",default='./checkpoint/ckpt_int8.pt',type=str)
+parser.add_argument("--num-batches",default=32,type=int)
+parser.add_argument("--batch-size",default=64,type=int)
+parser.add_argument("--benchmark",action="store_true")
+parser.add_argument("--batch-sizes",default='1,8,32,64',type=str)
+args = parser.parse_args()
+
+torch.backends.quantized.engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'fbgemm'
+
+# net definition
+net = Net(reid=True)
+assert os.path.isfile(args.checkpoint), "Error: no checkpoint file found!"
+print('Loading from {}'.format(args.checkpoint))
+checkpoint = torch.load(args.checkpoint, map_location='cpu')
+net.load_state_dict(checkpoint['net_dict'])
+net.eval()
+
+# calibration data, same preprocessing as test.py
+transform = torchvision.transforms.Compose([
+    torchvision.transforms.Resize((128,64)),
+    torchvision.transforms.ToTensor(),
+    torchvision.transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+calibloader = torch.utils.data.DataLoader(
+    torchvision.datasets.ImageFolder(os.path.join(args.data_dir, args.calib_dir), transform=transform),
+    batch_size=args.batch_size, shuffle=True
+)
+
+# quantize
+example_inputs = (torch.randn(1, 3, 128, 64),)
+prepared = prepare_fx(net, get_default_qconfig_mapping(torch.backends.quantized.engine), example_inputs)
+with torch.no_grad():
+    for idx, (inputs, _) in enumerate(calibloader):
+        if idx >= args.num_batches:
+            break
+        prepared(inputs)
+print('Calibrated on {} batches'.format(min(args.num_batches, len(calibloader))))
+quantized = convert_fx(prepared)
+quantized = torch.jit.freeze(torch.jit.script(quantized))
+torch.jit.save(quantized, args.output)
+print('Saved INT8 model to {}'.format(args.output))
+
+# CPU latency
+if args.benchmark:
+    print('{:>6s}{:>12s}{:>12s}   (ms per batch)'.format('batch', 'fp32', 'int8'))
+    with torch.no_grad():
+        for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+            x = torch.randn(batch_size, 3, 128, 64)
+            row = []
+            for model in (net, quantized):
+                model(x)
+                repeat = max(3, 128 // batch_size)
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    model(x)
+                row.append((time.perf_counter() - start) / repeat * 1e3)
+            print('{:>6d}{:>12.2f}{:>12.2f}'.format(batch_size, *row))
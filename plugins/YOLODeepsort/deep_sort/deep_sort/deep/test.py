@@ -11,6 +11,7 @@ parser = argparse.ArgumentParser(description="Train on market1501")
 parser.add_argument("--data-dir",default='data',type=str)
 parser.add_argument("--no-cuda",action="store_true")
 parser.add_argument("--gpu-id",default=0,type=int)
+parser.add_argument("--int8-model",default='',type=str, help="evaluate the INT8 model saved by quantize.py")
 args = parser.parse_args()
 
 # device
@@ -37,12 +38,19 @@ galleryloader = torch.utils.data.DataLoader(
 )
 
 # net definition
-net = Net(reid=True)
-assert os.path.isfile("./checkpoint/ckpt.t7"), "Error: no checkpoint file found!"
-print('Loading from checkpoint/ckpt.t7')
-checkpoint = torch.load("./checkpoint/ckpt.t7")
-net_dict = checkpoint['net_dict']
-net.load_state_dict(net_dict, strict=False)
+if args.int8_model:
+    # 量化模型只能在CPU上运行
+    assert os.path.isfile(args.int8_model), "Error: no INT8 model found!"
+    print('Loading from {}'.format(args.int8_model))
+    device = "cpu"
+    net = torch.jit.load(args.int8_model, map_location=device)
+else:
+    net = Net(reid=True)
+    assert os.path.isfile("./checkpoint/ckpt.t7"), "Error: no checkpoint file found!"
+    print('Loading from checkpoint/ckpt.t7')
+    checkpoint = torch.load("./checkpoint/ckpt.t7")
+    net_dict = checkpoint['net_dict']
+    net.load_state_dict(net_dict, strict=False)
 net.eval()
 net.to(device)
 
@@ -1,64 +1,147 @@
+from collections import namedtuple
+
 import numpy as np
 import torch
 
 from .deep.feature_extractor import Extractor
 from .sort.nn_matching import NearestNeighborDistanceMetric
 from .sort.preprocessing import non_max_suppression
-from .sort.detection import Detection
+from .sort.detection import DetectionBatch
 from .sort.tracker import Tracker
+from .sort.iou_matching import iou_matrix
 
 
 __all__ = ['DeepSort'] # __all__ 提供了暴露接口用的”白名单“
 
+# 检测框与多个缓存框的IoU都超过该值（或多个检测框指向同一缓存框）时认为有歧义，必须重新提取特征
+_REID_AMBIGUOUS_IOU = 0.3
+
+# prepare() 的结果：reid_xyxy 为本帧需要新提取特征的框，提取后交给 finish()
+PendingFrame = namedtuple('PendingFrame', ['bbox_tlwh', 'confidences', 'features', 'fresh', 'reid_xyxy'])
+
 
 class DeepSort(object):
-    def __init__(self, model_path, max_dist=0.2, min_confidence=0.3, nms_max_overlap=1.0, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True):
+    def __init__(self, model_path, max_dist=0.2, min_confidence=0.3, nms_max_overlap=1.0, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True, reid_reuse_iou=0.9, reid_reuse_frames=0, reid_backend='torch', extractor=None):
         self.min_confidence = min_confidence # 检测结果置信度阈值 
         self.nms_max_overlap = nms_max_overlap # 非极大抑制阈值，设置为1代表不进行抑制
-
-        self.extractor = Extractor(model_path, use_cuda=use_cuda) # 用于提取一个batch图片对应的特征
-
-        max_cosine_distance = max_dist # 最大余弦距离，用于级联匹配，如果大于该阈值，则忽略
+        # 特征复用策略：确认态轨迹的检测框与其上次提取特征时的框IoU大于reid_reuse_iou，
+        # 且距上次提取不足reid_reuse_frames帧时，直接复用缓存的特征；reid_reuse_frames为0时不复用
+        self.reid_reuse_iou = reid_reuse_iou
+        self.reid_reuse_frames = reid_reuse_frames
+
+        # 用于提取一个batch图片对应的特征；reid_backend为'torch'时model_path为ckpt.t7，否则为导出的ONNX模型
+        # 传入extractor时多个DeepSort共享同一个ReID模型，不再重复加载
+        self.extractor = extractor or Extractor(model_path, use_cuda=use_cuda, backend=reid_backend)
+
+        self.max_dist = max_dist
+        self.max_iou_distance = max_iou_distance
+        self.max_age = max_age
+        self.n_init = n_init
+        self.reset()
+
+    def reset(self):
+        """清空所有跟踪状态（轨迹、gallery、特征缓存与统计），保留已加载的ReID模型"""
+        self.reid_stats = {'extracted': 0, 'reused': 0} # 提取/复用的特征数量统计
+        self._frame_idx = 0
+        self._coasted = 0 # 上一次检测之后只做预测的帧数
+        self._feature_cache = {} # track_id -> (上次提取特征时的tlwh, feature, 帧号)
+
+        max_cosine_distance = self.max_dist # 最大余弦距离，用于级联匹配，如果大于该阈值，则忽略
         nn_budget = 100 # 每个类别gallery最多的外观描述子的个数，如果超过，删除旧的
         # NearestNeighborDistanceMetric 最近邻距离度量
         # 对于每个目标，返回到目前为止已观察到的任何样本的最近距离（欧式或余弦）。
         # 由距离度量方法构造一个 Tracker。
         # 第一个参数可选'cosine' or 'euclidean'
         metric = NearestNeighborDistanceMetric("cosine", max_cosine_distance, nn_budget)
-        self.tracker = Tracker(metric, max_iou_distance=max_iou_distance, max_age=max_age, n_init=n_init)
+        self.tracker = Tracker(metric, max_iou_distance=self.max_iou_distance, max_age=self.max_age, n_init=self.n_init)
 
-    def update(self, bbox_xywh, confidences, ori_img):
+    def update(self, bbox_xywh, confidences, ori_img, classes=None):
+        pending = self.prepare(bbox_xywh, confidences, ori_img, classes)
+        return self.finish(pending, self._get_features(pending.reid_xyxy, ori_img))
+
+    def prepare(self, bbox_xywh, confidences, ori_img, classes=None):
+        """
+        update() 的第一阶段：筛选检测框并决定哪些框需要重新提取ReID特征。\n
+        classes 为各框的类别，给出时非极大抑制只在同一类别内进行。\n
+        多路视频流可以先对每路调用 prepare()，把所有 reid_xyxy 合并成一个batch提取特征，再分别调用 finish()。
+        """
         self.height, self.width = ori_img.shape[:2]
-        # generate detections
-        # 从原图中抠取bbox对应图片并计算得到相应的特征
-        features = self._get_features(bbox_xywh, ori_img)
-        bbox_tlwh = self._xywh_to_tlwh(bbox_xywh)        
-        # 筛选掉小于min_confidence的目标，并构造一个Detection对象构成的列表
-        detections = [Detection(bbox_tlwh[i], conf, features[i]) for i,conf in enumerate(confidences) if conf>self.min_confidence]
+        bbox_xywh = self._to_numpy(bbox_xywh).reshape(-1, 4)
+        confidences = self._to_numpy(confidences).reshape(-1)
+        # 先筛选掉小于min_confidence的目标，被筛掉的框不再送入ReID网络
+        keep = confidences > self.min_confidence
+        bbox_xywh, confidences = bbox_xywh[keep], confidences[keep]
+        if classes is not None:
+            classes = self._to_numpy(classes).reshape(-1)[keep]
 
         # run on non-maximum supression
-        # boxes = np.array([d.tlwh for d in detections])
-        # scores = np.array([d.confidence for d in detections])
-        # indices = non_max_suppression(boxes, self.nms_max_overlap, scores)
-        # detections = [detections[i] for i in indices]
+        # 在抠图之前进行非极大抑制，重复的框不再送入ReID网络；nms_max_overlap>=1时不进行抑制
+        if self.nms_max_overlap < 1.0 and len(bbox_xywh) > 1:
+            indices = non_max_suppression(
+                self._xywh_to_tlwh(bbox_xywh), self.nms_max_overlap, confidences, classes)
+            indices = np.sort(indices) # 保持检测结果的原有顺序
+            bbox_xywh, confidences = bbox_xywh[indices], confidences[indices]
+
+        # generate detections
+        # 从原图中抠取bbox对应图片并计算得到相应的特征（可复用的特征直接取自缓存）
+        self._frame_idx += 1
+        bbox_tlwh = self._xywh_to_tlwh(bbox_xywh)
+        features, fresh = self._get_cached_features(bbox_tlwh)
+        return PendingFrame(bbox_tlwh, confidences, features, fresh, self._xywh_to_xyxy(bbox_xywh[fresh]))
+
+    def finish(self, pending, fresh_features):
+        """update() 的第二阶段：fresh_features 为 pending.reid_xyxy 对应的特征，执行关联并输出跟踪结果"""
+        bbox_tlwh, confidences, features, fresh, _ = pending
+        if features is None:
+            features = fresh_features
+        elif len(fresh_features):
+            features[fresh] = fresh_features
+        # 整帧的检测结果一次性构造为 DetectionBatch
+        detections = DetectionBatch(bbox_tlwh, confidences, features)
 
         # update tracker
         self.tracker.predict() # 将跟踪状态分布向前传播一步
-        self.tracker.update(detections) # 执行测量更新和跟踪管理
+        matches = self.tracker.update(detections, fresh) # 执行测量更新和跟踪管理；复用的特征不重复加入gallery
+        self._update_feature_cache(matches, detections, fresh)
+        self._coasted = 0
+        return self._outputs(1)
 
+    def coast(self, ori_img=None):
+        """
+        跳过检测的帧：只用卡尔曼滤波把轨迹向前预测一帧，不做特征提取和关联。\n
+        输出上一次检测时处于跟踪状态的确认态轨迹的预测框，格式与 update() 相同。
+        """
+        if ori_img is not None:
+            self.height, self.width = ori_img.shape[:2]
+        self._frame_idx += 1
+        self._coasted += 1
+        self.tracker.predict()
+        return self._outputs(self._coasted + 1)
+
+    def _outputs(self, max_time_since_update):
         # output bbox identities
-        outputs = []
-        for track in self.tracker.tracks:
-            if not track.is_confirmed() or track.time_since_update > 1:
-                continue
-            box = track.to_tlwh()
-            x1,y1,x2,y2 = self._tlwh_to_xyxy(box)
-            track_id = track.track_id
-            outputs.append(np.array([x1,y1,x2,y2,track_id], dtype=np.int))
-        if len(outputs) > 0:
-            outputs = np.stack(outputs,axis=0)
+        # 输出为 (K,5) 的整型数组，每行为 [x1,y1,x2,y2,track_id]
+        tracks = [track for track in self.tracker.tracks
+                  if track.is_confirmed() and track.time_since_update <= max_time_since_update]
+        outputs = np.zeros((len(tracks), 5), dtype=int)
+        if tracks:
+            bbox_xyah = np.array([track.mean[:4] for track in tracks])
+            bbox_tlwh = bbox_xyah.copy()
+            bbox_tlwh[:, 2] *= bbox_tlwh[:, 3]
+            bbox_tlwh[:, :2] -= bbox_tlwh[:, 2:] / 2
+            outputs[:, :4] = self._tlwh_to_xyxy(bbox_tlwh)
+            outputs[:, 4] = [track.track_id for track in tracks]
         return outputs
 
+    @staticmethod
+    def _to_numpy(x):
+        """转为 numpy 数组；整数（或列表）输入转为 float64，浮点输入保持原有精度"""
+        if isinstance(x, torch.Tensor):
+            x = x.detach().cpu().numpy()
+        x = np.asarray(x)
+        if not np.issubdtype(x.dtype, np.floating):
+            x = x.astype(np.float64)
+        return x
 
     """
     TODO:
@@ -72,20 +155,18 @@ class DeepSort(object):
             bbox_tlwh = bbox_xywh.copy()
         elif isinstance(bbox_xywh, torch.Tensor):
             bbox_tlwh = bbox_xywh.clone()
-        bbox_tlwh[:,0] = bbox_xywh[:,0] - bbox_xywh[:,2]/2.
-        bbox_tlwh[:,1] = bbox_xywh[:,1] - bbox_xywh[:,3]/2.
+        bbox_tlwh[:,:2] -= bbox_xywh[:,2:]/2.
         return bbox_tlwh
 
     #将bbox的[x,y,w,h] 转换成[x1,y1,x2,y2]
     #某些数据集例如 pascal_voc 的标注方式是采用[x，y，w，h]
     """Convert [x y w h] box format to [x1 y1 x2 y2] format."""
     def _xywh_to_xyxy(self, bbox_xywh):
-        x,y,w,h = bbox_xywh
-        x1 = max(int(x-w/2),0)
-        x2 = min(int(x+w/2),self.width-1)
-        y1 = max(int(y-h/2),0)
-        y2 = min(int(y+h/2),self.height-1)
-        return x1,y1,x2,y2
+        bbox_xywh = np.asarray(bbox_xywh).reshape(-1, 4)
+        half_wh = bbox_xywh[:, 2:] / 2
+        bbox_xyxy = np.trunc(np.hstack([bbox_xywh[:, :2] - half_wh,
+                                        bbox_xywh[:, :2] + half_wh])).astype(int)
+        return self._clip_xyxy(bbox_xyxy)
 
     def _tlwh_to_xyxy(self, bbox_tlwh):
         """
@@ -93,12 +174,16 @@ class DeepSort(object):
             Convert bbox from xtl_ytl_w_h to xc_yc_w_h
         Thanks JieChen91@github.com for reporting this bug!
         """
-        x,y,w,h = bbox_tlwh
-        x1 = max(int(x),0)
-        x2 = min(int(x+w),self.width-1)
-        y1 = max(int(y),0)
-        y2 = min(int(y+h),self.height-1)
-        return x1,y1,x2,y2
+        bbox_tlwh = np.asarray(bbox_tlwh, dtype=np.float64).reshape(-1, 4)
+        bbox_xyxy = np.trunc(np.hstack([bbox_tlwh[:, :2],
+                                        bbox_tlwh[:, :2] + bbox_tlwh[:, 2:]])).astype(int)
+        return self._clip_xyxy(bbox_xyxy)
+
+    def _clip_xyxy(self, bbox_xyxy):
+        np.maximum(bbox_xyxy[:, :2], 0, out=bbox_xyxy[:, :2])
+        np.minimum(bbox_xyxy[:, 2], self.width-1, out=bbox_xyxy[:, 2])
+        np.minimum(bbox_xyxy[:, 3], self.height-1, out=bbox_xyxy[:, 3])
+        return bbox_xyxy
 
     def _xyxy_to_tlwh(self, bbox_xyxy):
         x1,y1,x2,y2 = bbox_xyxy
@@ -109,17 +194,49 @@ class DeepSort(object):
         h = int(y2-y1)
         return t,l,w,h
     
+    def _get_cached_features(self, bbox_tlwh):
+        """
+        返回 (features, fresh)，fresh[i] 表示第i个检测框的特征需要本帧新提取；
+        features 中只填好了复用的特征，全部需要新提取时为 None
+        """
+        fresh = np.ones(len(bbox_tlwh), dtype=bool)
+        cache = [(track_id, entry) for track_id, entry in self._feature_cache.items()
+                 if self._frame_idx - entry[2] < self.reid_reuse_frames]
+        if cache and len(bbox_tlwh):
+            cached_tlwh = np.array([entry[0] for _, entry in cache])
+            iou = iou_matrix(np.asarray(bbox_tlwh, dtype=np.float64), cached_tlwh)
+            best = iou.argmax(axis=1)
+            overlaps = iou > _REID_AMBIGUOUS_IOU
+            fresh = ~((iou[np.arange(len(iou)), best] > self.reid_reuse_iou) &
+                      (overlaps.sum(axis=1) == 1) & (overlaps.sum(axis=0)[best] == 1))
+
+        num_fresh = int(fresh.sum())
+        self.reid_stats['extracted'] += num_fresh
+        self.reid_stats['reused'] += len(fresh) - num_fresh
+        if fresh.all():
+            return None, fresh
+
+        features = np.empty((len(fresh), len(cache[0][1][1])), dtype=np.float32)
+        features[~fresh] = [cache[c][1][1] for c in best[~fresh]]
+        return features, fresh
+
+    def _update_feature_cache(self, matches, detections, fresh):
+        if self.reid_reuse_frames <= 0:
+            return
+        confirmed = {track.track_id for track in self.tracker.tracks if track.is_confirmed()}
+        # 只用新提取的特征刷新缓存，复用的特征不刷新，缓存框保持为上次提取时的框
+        for track_id, detection_idx in matches:
+            if fresh[detection_idx] and track_id in confirmed:
+                self._feature_cache[track_id] = (detections.tlwh[detection_idx].copy(),
+                                                 detections.features[detection_idx].copy(),
+                                                 self._frame_idx)
+        for track_id in [k for k in self._feature_cache if k not in confirmed]:
+            del self._feature_cache[track_id]
+
     # 获取抠图部分的特征
-    def _get_features(self, bbox_xywh, ori_img):
-        im_crops = []
-        for box in bbox_xywh:
-            x1,y1,x2,y2 = self._xywh_to_xyxy(box)
-            im = ori_img[y1:y2,x1:x2] # 抠图部分
-            im_crops.append(im)
-        if im_crops:
-            features = self.extractor(im_crops) # 对抠图部分提取特征
-        else:
-            features = np.array([])
-        return features
+    def _get_features(self, bbox_xyxy, ori_img):
+        if len(bbox_xyxy) == 0:
+            return np.array([])
+        return self.extractor.extract(ori_img, bbox_xyxy) # 对抠图部分提取特征
 
 
@@ -2,6 +2,17 @@
 import numpy as np
 
 
+def tlwh_to_xyah(tlwh):
+    """Convert an Mx4 array of boxes from `(top left x, top left y, width,
+    height)` to `(center x, center y, aspect ratio, height)` in bulk.
+    批量将 tlwh 格式的框转换为 xyah 格式
+    """
+    ret = np.array(tlwh, dtype=np.float64).reshape(-1, 4)
+    ret[:, :2] += ret[:, 2:] / 2
+    ret[:, 2] /= ret[:, 3]
+    return ret
+
+
 class Detection(object):
     """
     This class represents a bounding box detection in a single image.
@@ -14,6 +25,9 @@ class Detection(object):
         Detector confidence score.
     feature : array_like
         A feature vector that describes the object contained in this image.
+    xyah : Optional[ndarray]
+        Precomputed bounding box in format `(center x, center y, aspect ratio,
+        height)`. Filled in by `DetectionBatch`; computed on demand otherwise.
 
     Attributes
     ----------
@@ -26,10 +40,13 @@ class Detection(object):
 
     """
 
-    def __init__(self, tlwh, confidence, feature):
-        self.tlwh = np.asarray(tlwh, dtype=np.float)
+    __slots__ = ('tlwh', 'confidence', 'feature', '_xyah')
+
+    def __init__(self, tlwh, confidence, feature, xyah=None):
+        self.tlwh = np.asarray(tlwh, dtype=np.float64)
         self.confidence = float(confidence)
         self.feature = np.asarray(feature, dtype=np.float32)
+        self._xyah = xyah
 
     def to_tlbr(self):
         """Convert bounding box to format `(min x, min y, max x, max y)`, i.e.,
@@ -42,8 +59,128 @@ class Detection(object):
     def to_xyah(self):
         """Convert bounding box to format `(center x, center y, aspect ratio,
         height)`, where the aspect ratio is `width / height`.
+
+        The returned array must not be modified in place; for detections that
+        belong to a `DetectionBatch` it is a row view of `DetectionBatch.xyah`.
+        """
+        if self._xyah is None:
+            self._xyah = tlwh_to_xyah(self.tlwh)[0]
+        return self._xyah
+
+
+class DetectionBatch(object):
+    """
+    All detections of a single frame stored as contiguous arrays. Box format
+    conversions are computed once for the whole frame.
+
+    一帧中的全部检测结果，以连续数组的形式保存；框格式转换每帧只批量计算一次。
+
+    Parameters
+    ----------
+    tlwh : array_like
+        An Mx4 array of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    confidence : array_like
+        An array of M detector confidence scores.
+    features : array_like
+        An MxD matrix of feature vectors.
+
+    Attributes
+    ----------
+    tlwh : ndarray
+        The Mx4 bounding boxes in format `(top left x, top left y, width,
+        height)`.
+    confidence : ndarray
+        The M detector confidence scores.
+    features : ndarray
+        The MxD float32 feature matrix.
+    xyah : ndarray
+        The Mx4 bounding boxes in format `(center x, center y, aspect ratio,
+        height)`.
+
+    Indexing a batch returns a `Detection` whose arrays are row views of the
+    batch, so no per-detection copies are made.
+    按下标取出的 Detection 直接引用批量数组中的行，不产生拷贝。
+
+    """
+
+    __slots__ = ('tlwh', 'confidence', 'features', 'xyah')
+
+    def __init__(self, tlwh, confidence, features):
+        self.tlwh = np.ascontiguousarray(tlwh, dtype=np.float64).reshape(-1, 4)
+        self.confidence = np.ascontiguousarray(
+            confidence, dtype=np.float64).reshape(-1)
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        # 没有特征时（如整帧的框都被筛掉）为 (N, 0)，不能用 -1 推断列数
+        if features.size == 0:
+            self.features = features.reshape(len(self.tlwh), 0)
+        else:
+            self.features = features.reshape(len(self.tlwh), -1)
+        self.xyah = tlwh_to_xyah(self.tlwh)
+
+    @classmethod
+    def from_detections(cls, detections):
+        """Build a batch from a list of `Detection` objects."""
+        if len(detections) == 0:
+            return cls(np.zeros((0, 4)), np.zeros(0), np.zeros((0, 0)))
+        return cls(np.asarray([d.tlwh for d in detections]),
+                   np.asarray([d.confidence for d in detections]),
+                   np.asarray([d.feature for d in detections]))
+
+    def __len__(self):
+        return len(self.tlwh)
+
+    def __getitem__(self, idx):
+        return Detection(self.tlwh[idx], self.confidence[idx],
+                         self.features[idx], self.xyah[idx])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def to_tlbr(self):
+        """Convert all bounding boxes to format `(min x, min y, max x, max y)`.
         """
         ret = self.tlwh.copy()
-        ret[:2] += ret[2:] / 2
-        ret[2] /= ret[3]
+        ret[:, 2:] += ret[:, :2]
         return ret
+
+
+if __name__ == '__main__':
+    # 基准：比较逐个构造 Detection 对象与 DetectionBatch 每帧的内存占用和分配次数。
+    # 模拟一帧的匹配过程：读取全部框、特征以及两次 to_xyah（级联匹配门控 + 新建轨迹）。
+    import tracemalloc
+
+    num_dets, feature_dim = 100, 512
+    rng = np.random.default_rng(0)
+    tlwh = rng.uniform(1, 500, size=(num_dets, 4))
+    confidence = rng.uniform(size=num_dets)
+    features = rng.normal(size=(num_dets, feature_dim)).astype(np.float32)
+
+    def per_object():
+        detections = [Detection(tlwh[i], confidence[i], features[i])
+                      for i in range(num_dets)]
+        boxes = np.asarray([d.tlwh for d in detections])
+        feats = np.array([d.feature for d in detections])
+        xyah = [d.to_xyah() for d in detections] + [d.to_xyah() for d in detections]
+        return detections, boxes, feats, xyah
+
+    def batched():
+        detections = DetectionBatch(tlwh, confidence, features)
+        boxes = detections.tlwh
+        feats = detections.features
+        xyah = detections.xyah
+        return detections, boxes, feats, xyah
+
+    for name, fn in (('Detection list', per_object), ('DetectionBatch', batched)):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        frame = fn()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        size = sum(s.size_diff for s in stats)
+        count = sum(s.count_diff for s in stats)
+        print('{:<16s} {:>10d} bytes {:>6d} allocations per frame ({} detections)'.format(
+            name, size, count, num_dets))
+        del frame
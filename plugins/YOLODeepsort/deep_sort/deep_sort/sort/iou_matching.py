@@ -39,9 +39,39 @@ def iou(bbox, candidates):
     area_candidates = candidates[:, 2:].prod(axis=1)
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
+
+def iou_matrix(bboxes, candidates):
+    """Compute pair-wise intersection over union between two sets of boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of candidate bounding boxes in the same format.
+
+    Returns
+    -------
+    ndarray
+        Returns a matrix of size N, M such that element (i, j) contains the
+        intersection over union between `bboxes[i]` and `candidates[j]`.
+
+    """
+    bboxes_tl, bboxes_br = bboxes[:, None, :2], bboxes[:, None, :2] + bboxes[:, None, 2:]
+    candidates_tl = candidates[None, :, :2]
+    candidates_br = candidates[None, :, :2] + candidates[None, :, 2:]
+
+    wh = np.maximum(0., np.minimum(bboxes_br, candidates_br) -
+                    np.maximum(bboxes_tl, candidates_tl))
+    area_intersection = wh.prod(axis=2)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)[:, None]
+    area_candidates = candidates[:, 2:].prod(axis=1)[None, :]
+    return area_intersection / (area_bboxes + area_candidates - area_intersection)
+
 # 计算tracks和detections之间的IOU距离成本矩阵
 def iou_cost(tracks, detections, track_indices=None,
-             detection_indices=None):
+             detection_indices=None, max_time_since_update=1):
     """An intersection over union distance metric.
 
     用于计算tracks和detections之间的iou距离矩阵
@@ -50,14 +80,18 @@ def iou_cost(tracks, detections, track_indices=None,
     ----------
     tracks : List[deep_sort.track.Track]
         A list of tracks.
-    detections : List[deep_sort.detection.Detection]
-        A list of detections.
+    detections : deep_sort.detection.DetectionBatch | List[deep_sort.detection.Detection]
+        The detections.
     track_indices : Optional[List[int]]
         A list of indices to tracks that should be matched. Defaults to
         all `tracks`.
     detection_indices : Optional[List[int]]
         A list of indices to detections that should be matched. Defaults
         to all `detections`.
+    max_time_since_update : int
+        Tracks that have not been updated for more frames than this get
+        infinite cost. Larger than 1 when frames were skipped between
+        detections.
 
     Returns
     -------
@@ -72,13 +106,19 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros((len(track_indices), len(detection_indices)))
 
-        bbox = tracks[track_idx].to_tlwh()
+    # 一次性把所有轨迹的均值 (x, y, a, h) 转换为 tlwh
+    bboxes = np.array([tracks[i].mean[:4] for i in track_indices])
+    bboxes[:, 2] *= bboxes[:, 3]
+    bboxes[:, :2] -= bboxes[:, 2:] / 2
+    if hasattr(detections, 'tlwh'):
+        candidates = detections.tlwh[np.asarray(detection_indices, dtype=int)]
+    else:
         candidates = np.asarray([detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
+
+    cost_matrix = 1. - iou_matrix(bboxes, candidates)
+    stale = np.array([tracks[i].time_since_update > max_time_since_update for i in track_indices])
+    cost_matrix[stale, :] = linear_assignment.INFTY_COST
     return cost_matrix
@@ -233,8 +233,12 @@ def gate_cost_matrix(
     # 通过从逆chi^2分布计算95%置信区间的阈值，排除可能性小的关联。
     # 四维测量空间对应的马氏阈值为9.4877
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
-    measurements = np.asarray(
-        [detections[i].to_xyah() for i in detection_indices])
+    if hasattr(detections, 'xyah'):
+        # DetectionBatch 已经批量计算好 xyah
+        measurements = detections.xyah[np.asarray(detection_indices, dtype=int)]
+    else:
+        measurements = np.asarray(
+            [detections[i].to_xyah() for i in detection_indices])
     for row, track_idx in enumerate(track_indices):
         track = tracks[track_idx]
         #KalmanFilter.gating_distance 计算状态分布和测量之间的选通距离
@@ -70,48 +70,6 @@ def _cosine_distance(a, b, data_is_normalized=False):
     return 1. - np.dot(a, b.T) # 余弦距离 = 1 - 余弦相似度
 
 
-def _nn_euclidean_distance(x, y):
-    """ Helper function for nearest neighbor distance metric (Euclidean).
-
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest Euclidean distance to a sample in `x`.
-
-    """
-    distances = _pdist(x, y)
-    return np.maximum(0.0, distances.min(axis=0))
-
-
-def _nn_cosine_distance(x, y):
-    """ Helper function for nearest neighbor distance metric (cosine).
-
-    Parameters
-    ----------
-    x : ndarray
-        A matrix of N row-vectors (sample points).
-    y : ndarray
-        A matrix of M row-vectors (query points).
-
-    Returns
-    -------
-    ndarray
-        A vector of length M that contains for each entry in `y` the
-        smallest cosine distance to a sample in `x`.
-
-    """
-    distances = _cosine_distance(x, y)
-    return distances.min(axis=0)
-
-
 class NearestNeighborDistanceMetric(object):
     """
     A nearest neighbor distance metric that, for each target, returns
@@ -119,6 +77,13 @@ class NearestNeighborDistanceMetric(object):
 
     对于每个目标，返回最近邻居的距离度量, 即与到目前为止已观察到的任何样本的最接近距离。
 
+    Samples are kept in a preallocated ring buffer of shape
+    `(num_targets, budget, dim)`. Every target owns one slot of the buffer;
+    slots of targets that leave the scene are recycled in O(1).
+
+    样本保存在预分配的 (目标数, budget, 特征维度) 环形缓冲区中，每个目标占用一个槽位，
+    目标离开场景时其槽位直接回收复用。
+
     Parameters
     ----------
     metric : str
@@ -132,29 +97,95 @@ class NearestNeighborDistanceMetric(object):
         the oldest samples when the budget is reached.
         如果不是None，则将每个类别的样本最多固定为该数字。 
         删除达到budget时最古老的样本。
+    dtype : Optional[numpy.dtype]
+        Storage type of the sample buffer, either `np.float32` (default) or
+        `np.float16` to halve the gallery memory. Distances are always
+        computed in float32.
+        样本缓冲区的存储类型，float16 可将 gallery 内存减半，距离计算仍使用 float32。
 
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
-        一个从目标ID映射到到目前为止已经观察到的样本列表的字典
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that
+        have been observed so far (oldest first). For the cosine metric the
+        stored samples are normalized to unit length.
+        一个从目标ID映射到到目前为止已经观察到的样本的字典（余弦距离下为归一化后的样本）
 
     """
 
-    def __init__(self, metric, matching_threshold, budget=None):
-
-
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance # 欧式距离
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance # 余弦距离
-        else:
+    def __init__(self, metric, matching_threshold, budget=None, dtype=np.float32):
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float16):
+            raise ValueError(
+                "Invalid dtype; must be either float32 or float16")
+        self.dtype = dtype
+        self.metric = metric # 欧式距离 或 余弦距离
         self.matching_threshold = matching_threshold
-        self.budget = budget # budge用于控制 feature 的数目
-        self.samples = {}
+        self.budget = budget # budget用于控制 feature 的数目
+
+        # 环形缓冲区在第一次 partial_fit 时按特征维度分配
+        self._gallery = None # (num_targets, depth, dim)
+        self._counts = np.zeros(0, dtype=np.int64) # 每个槽位中的有效样本数
+        self._heads = np.zeros(0, dtype=np.int64) # 每个槽位下一次写入的位置
+        self._slots = {} # 目标ID -> 槽位
+        self._free_slots = [] # 空闲槽位
+
+    @property
+    def samples(self):
+        samples = {}
+        if self._gallery is None:
+            return samples
+        depth = self._gallery.shape[1]
+        for target, slot in self._slots.items():
+            n = self._counts[slot]
+            order = (self._heads[slot] - n + np.arange(n)) % depth
+            samples[target] = self._gallery[slot, order]
+        return samples
+
+    def _allocate(self, dim, num_targets=32):
+        depth = self.budget if self.budget is not None else 16
+        self._gallery = np.zeros((num_targets, depth, dim), dtype=self.dtype)
+        self._counts = np.zeros(num_targets, dtype=np.int64)
+        self._heads = np.zeros(num_targets, dtype=np.int64)
+        self._free_slots = list(range(num_targets - 1, -1, -1))
+
+    def _grow_targets(self):
+        # 槽位用尽时容量翻倍
+        num_targets, depth, dim = self._gallery.shape
+        gallery = np.zeros((2 * num_targets, depth, dim), dtype=self.dtype)
+        gallery[:num_targets] = self._gallery
+        self._gallery = gallery
+        self._counts = np.concatenate(
+            [self._counts, np.zeros(num_targets, dtype=np.int64)])
+        self._heads = np.concatenate(
+            [self._heads, np.zeros(num_targets, dtype=np.int64)])
+        self._free_slots.extend(range(2 * num_targets - 1, num_targets - 1, -1))
+
+    def _grow_depth(self):
+        # 仅在 budget 为 None 时使用：此时环形缓冲区从不回绕，直接加深
+        num_targets, depth, dim = self._gallery.shape
+        gallery = np.zeros((num_targets, 2 * depth, dim), dtype=self.dtype)
+        gallery[:, :depth] = self._gallery
+        self._gallery = gallery
+
+    def _acquire_slot(self, target):
+        slot = self._slots.get(target)
+        if slot is None:
+            if not self._free_slots:
+                self._grow_targets()
+            slot = self._free_slots.pop()
+            self._counts[slot] = 0
+            self._heads[slot] = 0
+            self._slots[target] = slot
+        return slot
+
+    def _release_slot(self, target):
+        slot = self._slots.pop(target)
+        self._counts[slot] = 0
+        self._free_slots.append(slot)
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -168,19 +199,39 @@ class NearestNeighborDistanceMetric(object):
             An integer array of associated target identities.
         active_targets : List[int]
             A list of targets that are currently present in the scene.
-        传入特征列表及其对应id，partial_fit构造一个活跃目标的特征字典。
+        传入特征列表及其对应id，partial_fit将特征写入活跃目标的环形缓冲区槽位，
+        并回收不再活跃的目标的槽位。
 
         """
+        active_targets = set(active_targets)
+        # 回收不再活跃的目标槽位
+        for target in [k for k in self._slots if k not in active_targets]:
+            self._release_slot(target)
+
+        if len(targets) == 0:
+            return
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine":
+            # 写入前先归一化，distance 中无需再对 gallery 归一化
+            features = features / np.linalg.norm(features, axis=1, keepdims=True)
+        if self._gallery is None:
+            self._allocate(features.shape[1])
+
         for feature, target in zip(features, targets):
-            # 对应目标下添加新的feature，更新feature集合
-            # samples字典    d: feature list}
-            self.samples.setdefault(target, []).append(feature)
+            target = int(target)
+            if target not in active_targets:
+                continue
+            slot = self._acquire_slot(target)
+            depth = self._gallery.shape[1]
+            if self.budget is None and self._counts[slot] == depth:
+                self._grow_depth()
+                depth = self._gallery.shape[1]
+            # 超过 budget 时覆盖最旧的样本；budget 为 None 时写入位置不回绕，始终等于样本数
+            self._gallery[slot, self._heads[slot]] = feature
+            self._heads[slot] += 1
             if self.budget is not None:
-                # 只考虑budget个目标，超过直接忽略
-                self.samples[target] = self.samples[target][-self.budget:]
-        
-        # 筛选激活的目标；samples是一个字典{id->feature list}
-        self.samples = {k: self.samples[k] for k in active_targets}
+                self._heads[slot] %= depth
+            self._counts[slot] = min(self._counts[slot] + 1, depth)
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -202,6 +253,40 @@ class NearestNeighborDistanceMetric(object):
         计算features和targets之间的距离，返回一个成本矩阵（代价矩阵）
         """
         cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
+        if len(targets) == 0 or len(features) == 0:
+            return cost_matrix
+
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine":
+            # 查询特征只归一化一次
+            features = features / np.linalg.norm(features, axis=1, keepdims=True)
+
+        # 槽位中的有效样本总是位于 [0, count) 区间（未回绕时按顺序写入，回绕后已写满），
+        # 将所有目标的有效样本拼接成一个矩阵，offsets 记录每个目标段的起始行
+        slots = np.array([self._slots[int(target)] for target in targets])
+        counts = self._counts[slots]
+        offsets = np.zeros(len(slots), dtype=np.int64)
+        np.cumsum(counts[:-1], out=offsets[1:])
+        total = int(counts.sum())
+        cost_matrix[:] = np.inf # 没有样本的目标距离为无穷大
+        if total == 0:
+            return cost_matrix
+
+        depth, dim = self._gallery.shape[1:]
+        rows = np.repeat(slots * depth - offsets, counts) + np.arange(total)
+        gallery = self._gallery.reshape(-1, dim)[rows].astype(np.float32, copy=False)
+
+        # 一次矩阵乘法得到全部样本与全部 features 的内积 (total, N)
+        products = np.dot(gallery, features.T)
+        if self.metric == "cosine":
+            distances = 1. - products
+        else:
+            a2 = np.square(gallery).sum(axis=1)[:, None]
+            b2 = np.square(features).sum(axis=1)[None, :]
+            distances = np.maximum(0., a2 + b2 - 2. * products)
+
+        # 按目标分段取最小值
+        nonempty = counts > 0
+        cost_matrix[nonempty] = np.minimum.reduceat(
+            distances, offsets[nonempty], axis=0)
         return cost_matrix
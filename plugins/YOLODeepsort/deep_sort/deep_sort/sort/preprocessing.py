@@ -2,8 +2,11 @@
 import numpy as np
 import cv2
 
+# 框数不超过该值时使用重叠矩阵实现，否则逐个保留框扫描
+_MATRIX_NMS_MAX_BOXES = 384
 
-def non_max_suppression(boxes, max_bbox_overlap, scores=None):
+
+def non_max_suppression(boxes, max_bbox_overlap, scores=None, classes=None):
     """Suppress overlapping detections.
 
     Original code from [1]_ has been adapted to include confidence score.
@@ -27,6 +30,10 @@ def non_max_suppression(boxes, max_bbox_overlap, scores=None):
         ROIs that overlap more than this values are suppressed.
     scores : Optional[array_like]
         Detector confidence score.
+    classes : Optional[array_like]
+        Class id of each ROI. If given, boxes are only suppressed by boxes of
+        the same class.
+        给出类别时只在同一类别内抑制，避免行人框被包含它的车辆框抑制掉。
 
     Returns
     -------
@@ -37,37 +44,83 @@ def non_max_suppression(boxes, max_bbox_overlap, scores=None):
     if len(boxes) == 0:
         return []
 
-    boxes = boxes.astype(np.float)
-    pick = []
-
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if classes is not None:
+        classes = np.asarray(classes).reshape(-1)
+        scores = None if scores is None else np.asarray(scores).reshape(-1)
+        pick = []
+        for c in np.unique(classes):
+            members = np.flatnonzero(classes == c)
+            kept = non_max_suppression(
+                boxes[members], max_bbox_overlap,
+                None if scores is None else scores[members])
+            pick.extend(int(i) for i in members[kept])
+        return pick
     x1 = boxes[:, 0]
     y1 = boxes[:, 1]
     x2 = boxes[:, 2] + boxes[:, 0]
     y2 = boxes[:, 3] + boxes[:, 1]
 
-    area = (x2 - x1 + 1) * (y2 - y1 + 1)
+    # 按分数从高到低排序
     if scores is not None:
-        idxs = np.argsort(scores)
+        order = np.argsort(scores)[::-1]
     else:
-        idxs = np.argsort(y2)
-
-    while len(idxs) > 0:
-        last = len(idxs) - 1
-        i = idxs[last]
-        pick.append(i)
-
-        xx1 = np.maximum(x1[i], x1[idxs[:last]])
-        yy1 = np.maximum(y1[i], y1[idxs[:last]])
-        xx2 = np.minimum(x2[i], x2[idxs[:last]])
-        yy2 = np.minimum(y2[i], y2[idxs[:last]])
+        order = np.argsort(y2)[::-1]
+    x1, y1, x2, y2 = x1[order], y1[order], x2[order], y2[order]
+    area = (x2 - x1 + 1) * (y2 - y1 + 1)
 
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
+    pick = []
+    suppressed = np.zeros(len(order), dtype=bool)
+    if len(order) <= _MATRIX_NMS_MAX_BOXES:
+        # 框较少时一次性计算所有框两两之间的重叠比例，overlap[i, j] 为交集占第 j 个框面积的比例
+        w = np.maximum(0, np.minimum(x2[:, None], x2[None, :]) -
+                       np.maximum(x1[:, None], x1[None, :]) + 1)
+        h = np.maximum(0, np.minimum(y2[:, None], y2[None, :]) -
+                       np.maximum(y1[:, None], y1[None, :]) + 1)
+        suppress = (w * h) / area[None, :] > max_bbox_overlap
+
+        # 依次保留未被抑制的框，并抑制与其重叠过大的框
+        for i in range(len(order)):
+            if suppressed[i]:
+                continue
+            pick.append(int(order[i]))
+            suppressed |= suppress[i]
+    else:
+        # 框较多时避免 O(N^2) 的内存，只对每个保留的框计算其与后续框的重叠比例
+        for i in range(len(order)):
+            if suppressed[i]:
+                continue
+            pick.append(int(order[i]))
+            rest = slice(i + 1, None)
+            w = np.minimum(x2[i], x2[rest])
+            w -= np.maximum(x1[i], x1[rest])
+            w += 1
+            np.maximum(w, 0, out=w)
+            h = np.minimum(y2[i], y2[rest])
+            h -= np.maximum(y1[i], y1[rest])
+            h += 1
+            np.maximum(h, 0, out=h)
+            w *= h
+            w /= area[rest]
+            suppressed[rest] |= w > max_bbox_overlap
 
-        overlap = (w * h) / area[idxs[:last]] # IOU 
+    return pick
 
-        idxs = np.delete(
-            idxs, np.concatenate(
-                ([last], np.where(overlap > max_bbox_overlap)[0])))
 
-    return pick
+if __name__ == '__main__':
+    # 吞吐量基准：在随机生成的聚集框上测试非极大抑制
+    import time
+
+    rng = np.random.default_rng(0)
+    for num_boxes in (50, 200, 1000):
+        centers = rng.uniform(0, 1920, size=(num_boxes // 5 + 1, 2))
+        xy = centers[rng.integers(0, len(centers), num_boxes)] + rng.normal(0, 10, (num_boxes, 2))
+        boxes = np.hstack([xy, rng.uniform(20, 120, size=(num_boxes, 2))])
+        scores = rng.uniform(size=num_boxes)
+        repeat = max(1, 20000 // num_boxes)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            indices = non_max_suppression(boxes, 0.5, scores)
+        elapsed = (time.perf_counter() - start) / repeat
+        print('{:>5d} boxes: {:8.3f} ms/call, {:10.0f} boxes/s, {} kept'.format(
+            num_boxes, elapsed * 1e3, num_boxes / elapsed, len(indices)))
@@ -1,4 +1,5 @@
 # vim: expandtab:ts=4:sw=4
+import numpy as np
 
 
 class TrackState:
@@ -78,13 +79,19 @@ class Track:
         自上次测量更新以来的总帧数
     state : TrackState
         The current track state.
-    features : List[ndarray]
-        A cache of features. On each measurement update, the associated feature
-        vector is added to this list.
-        feature缓存(gallery)。每次测量更新时，相关feature向量添加到此列表中
+    features : ndarray
+        A cache of features not yet handed to the distance metric, as a
+        read-only KxD view. On each measurement update, the associated feature
+        vector is appended to this cache (unless it was reused from an earlier
+        frame); `clear_features` empties it.
+        feature缓存(gallery)。每次测量更新时，相关feature向量写入此缓存
 
     """
 
+    __slots__ = ('mean', 'covariance', 'track_id', 'hits', 'age',
+                 'time_since_update', 'state', '_features', '_num_features',
+                 '_n_init', '_max_age')
+
     def __init__(self, mean, covariance, track_id, n_init, max_age,
                  feature=None):
         self.mean = mean
@@ -98,14 +105,39 @@ class Track:
         self.time_since_update = 0
 
         self.state = TrackState.Tentative # 初始化一个Track的时设置Tentative状态
-        # 每个track对应多个features, 每次更新都会将最新的feature添加到列表中
-        self.features = []
-        if feature is not None:
-            self.features.append(feature)
-
         self._n_init = n_init 
         self._max_age = max_age
 
+        # 每个track对应多个features, 每次更新都会将最新的feature写入预分配的缓存
+        self._features = None
+        self._num_features = 0
+        if feature is not None:
+            self._append_feature(feature)
+
+    @property
+    def features(self):
+        if self._features is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._features[:self._num_features]
+
+    def clear_features(self):
+        """Empty the feature cache, keeping its storage for reuse."""
+        self._num_features = 0
+
+    def _append_feature(self, feature):
+        if self._features is None:
+            self._features = np.empty(
+                (max(self._n_init, 1), len(feature)), dtype=np.float32)
+        elif self._num_features == len(self._features):
+            # 缓存已满时容量翻倍（仅 Tentative 状态的轨迹会累积多个 feature）
+            features = np.empty(
+                (2 * len(self._features), self._features.shape[1]),
+                dtype=np.float32)
+            features[:self._num_features] = self._features
+            self._features = features
+        self._features[self._num_features] = feature
+        self._num_features += 1
+
     def to_tlwh(self):
         """Get current position in bounding box format `(top left x, top left y,
         width, height)`.
@@ -150,7 +182,7 @@ class Track:
         self.age += 1
         self.time_since_update += 1
 
-    def update(self, kf, detection):
+    def update(self, kf, detection, add_feature=True):
         """Perform Kalman filter measurement update step and update the feature
         cache.
         执行卡尔曼滤波器测量更新步骤并更新feature缓存
@@ -161,11 +193,16 @@ class Track:
             The Kalman filter.
         detection : Detection
             The associated detection.
+        add_feature : bool
+            If False, the detection's feature is not a new appearance sample
+            (e.g. reused from an earlier frame) and is not added to the cache.
+            为False时该特征不是新的外观样本（如复用的缓存特征），不加入gallery
 
         """
         self.mean, self.covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah())
-        self.features.append(detection.feature)
+        if add_feature:
+            self._append_feature(detection.feature)
 
         self.hits += 1
         self.time_since_update = 0
@@ -1,10 +1,12 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
+from functools import partial
 import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
 from .track import Track
+from .detection import DetectionBatch
 
 
 class Tracker:
@@ -49,6 +51,7 @@ class Tracker:
         self.kf = kalman_filter.KalmanFilter() # 实例化卡尔曼滤波器
         self.tracks = []   # 保存一个轨迹列表，用于保存一系列轨迹
         self._next_id = 1  # 下一个分配的轨迹id
+        self._steps = 0  # 上次 update 之后调用 predict 的次数，跳帧检测时大于1
  
     def predict(self):
         """Propagate track state distributions one time step forward.
@@ -58,20 +61,38 @@ class Tracker:
         """
         for track in self.tracks:
             track.predict(self.kf)
+        self._steps += 1
 
-    def update(self, detections):
+    def update(self, detections, new_features=None):
         """Perform measurement update and track management.
         执行测量更新和轨迹管理
 
         Parameters
         ----------
-        detections : List[deep_sort.detection.Detection]
-            A list of detections at the current time step.
+        detections : deep_sort.detection.DetectionBatch | List[deep_sort.detection.Detection]
+            The detections at the current time step. A list is converted to a
+            `DetectionBatch` first.
+        new_features : Optional[ndarray]
+            Boolean mask over the detections; False marks a feature that was
+            reused rather than extracted in this frame. Such features are still
+            used for matching but not added to the matched track's gallery.
+            为False的检测框特征是复用的，只用于匹配，不加入匹配轨迹的gallery
+
+        Returns
+        -------
+        List[(int, int)]
+            The `(track_id, detection index)` pairs matched in this step.
+            本帧匹配上的 (track_id, detection索引) 列表
 
         """
+        if not isinstance(detections, DetectionBatch):
+            detections = DetectionBatch.from_detections(detections)
+
         # Run matching cascade.
         matches, unmatched_tracks, unmatched_detections = \
             self._match(detections)
+        matched_ids = [(self.tracks[track_idx].track_id, detection_idx)
+                       for track_idx, detection_idx in matches]
 
         # Update track set.
         
@@ -79,7 +100,8 @@ class Tracker:
         for track_idx, detection_idx in matches:
             # 更新tracks中相应的detection
             self.tracks[track_idx].update(
-                self.kf, detections[detection_idx])
+                self.kf, detections[detection_idx],
+                new_features is None or bool(new_features[detection_idx]))
         
         # 2. 针对未匹配的track, 调用mark_missed进行标记
         # track失配时，若Tentative则删除；若update时间很久也删除
@@ -100,18 +122,25 @@ class Tracker:
             # 获取所有Confirmed状态的track id
             if not track.is_confirmed():
                 continue
-            features += track.features # 将Confirmed状态的track的features添加到features列表
+            features.append(track.features) # 将Confirmed状态的track的features添加到features列表
             # 获取每个feature对应的track_id
-            targets += [track.track_id for _ in track.features]
-            track.features = []
+            targets.append(np.full(len(track.features), track.track_id))
+        if features:
+            features, targets = np.concatenate(features), np.concatenate(targets)
+        else:
+            features, targets = np.asarray([]), np.asarray([], dtype=int)
         # 距离度量中的特征集更新
-        self.metric.partial_fit(
-            np.asarray(features), np.asarray(targets), active_targets)
+        self.metric.partial_fit(features, targets, active_targets)
+        for track in self.tracks:
+            if track.is_confirmed():
+                track.clear_features()
+        self._steps = 0
+        return matched_ids
 
     def _match(self, detections):
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
-            features = np.array([dets[i].feature for i in detection_indices])
+            features = dets.features[detection_indices]
             targets = np.array([tracks[i].track_id for i in track_indices])
             
             # 通过最近邻（余弦距离）计算出成本矩阵（代价矩阵）
@@ -142,18 +171,20 @@ class Tracker:
         # Associate remaining tracks together with unconfirmed tracks using IOU.        
         # 将未确定态的轨迹和刚刚没有匹配上的轨迹组合为 iou_track_candidates 
         # 并进行基于IoU的匹配
+        # 跳帧检测时，上一个检测帧还匹配上的轨迹 time_since_update 等于两次检测之间 predict 的次数
+        steps = max(self._steps, 1)
         iou_track_candidates = unconfirmed_tracks + [
             k for k in unmatched_tracks_a if
-            self.tracks[k].time_since_update == 1] # 刚刚没有匹配上的轨迹
+            self.tracks[k].time_since_update == steps] # 刚刚没有匹配上的轨迹
         unmatched_tracks_a = [
             k for k in unmatched_tracks_a if
-            self.tracks[k].time_since_update != 1] # 并非刚刚没有匹配上的轨迹
+            self.tracks[k].time_since_update != steps] # 并非刚刚没有匹配上的轨迹
         # 对级联匹配中还没有匹配成功的目标再进行IoU匹配
         # min_cost_matching 使用匈牙利算法解决线性分配问题。
         # 传入 iou_cost，尝试关联剩余的轨迹与未确认的轨迹。
         matches_b, unmatched_tracks_b, unmatched_detections = \
             linear_assignment.min_cost_matching(
-                iou_matching.iou_cost, self.max_iou_distance, self.tracks,
+                partial(iou_matching.iou_cost, max_time_since_update=steps), self.max_iou_distance, self.tracks,
                 detections, iou_track_candidates, unmatched_detections)
 
         matches = matches_a + matches_b # 组合两部分匹配 
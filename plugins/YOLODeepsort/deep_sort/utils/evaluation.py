@@ -3,15 +3,23 @@ import numpy as np
 import copy
 import motmetrics as mm
 mm.lap.default_solver = 'lap'
-from utils.io import read_results, unzip_objs
+from .io import read_results
+
+_EMPTY_FRAME = (np.empty((0, 4)), np.empty(0, dtype=int), np.empty(0))
+
+
+def _eval_sequence(data_root, seq_name, data_type, filename, cache):
+    """进程池中执行：评估一个序列的结果文件，返回其 MOTAccumulator"""
+    return Evaluator(data_root, seq_name, data_type, cache=cache).eval_file(filename)
 
 
 class Evaluator(object):
 
-    def __init__(self, data_root, seq_name, data_type):
+    def __init__(self, data_root, seq_name, data_type, cache=False):
         self.data_root = data_root
         self.seq_name = seq_name
         self.data_type = data_type
+        self.cache = cache # 为True时标注文件解析后保存二进制缓存，再次评估时直接加载
 
         self.load_annotations()
         self.reset_accumulator()
@@ -20,8 +28,9 @@ class Evaluator(object):
         assert self.data_type == 'mot'
 
         gt_filename = os.path.join(self.data_root, self.seq_name, 'gt', 'gt.txt')
-        self.gt_frame_dict = read_results(gt_filename, self.data_type, is_gt=True)
-        self.gt_ignore_frame_dict = read_results(gt_filename, self.data_type, is_ignore=True)
+        # 每帧的标注为 (tlwhs, ids, scores) 数组
+        self.gt_frame_dict = read_results(gt_filename, self.data_type, is_gt=True, as_arrays=True, cache=self.cache)
+        self.gt_ignore_frame_dict = read_results(gt_filename, self.data_type, is_ignore=True, as_arrays=True, cache=self.cache)
 
     def reset_accumulator(self):
         self.acc = mm.MOTAccumulator(auto_id=True)
@@ -32,12 +41,10 @@ class Evaluator(object):
         trk_ids = np.copy(trk_ids)
 
         # gts
-        gt_objs = self.gt_frame_dict.get(frame_id, [])
-        gt_tlwhs, gt_ids = unzip_objs(gt_objs)[:2]
+        gt_tlwhs, gt_ids = self.gt_frame_dict.get(frame_id, _EMPTY_FRAME)[:2]
 
         # ignore boxes
-        ignore_objs = self.gt_ignore_frame_dict.get(frame_id, [])
-        ignore_tlwhs = unzip_objs(ignore_objs)[0]
+        ignore_tlwhs = self.gt_ignore_frame_dict.get(frame_id, _EMPTY_FRAME)[0]
 
 
         # remove ignored results
@@ -69,17 +76,47 @@ class Evaluator(object):
     def eval_file(self, filename):
         self.reset_accumulator()
 
-        result_frame_dict = read_results(filename, self.data_type, is_gt=False)
+        result_frame_dict = read_results(filename, self.data_type, is_gt=False, as_arrays=True)
         frames = sorted(list(set(self.gt_frame_dict.keys()) | set(result_frame_dict.keys())))
         for frame_id in frames:
-            trk_objs = result_frame_dict.get(frame_id, [])
-            trk_tlwhs, trk_ids = unzip_objs(trk_objs)[:2]
+            trk_tlwhs, trk_ids = result_frame_dict.get(frame_id, _EMPTY_FRAME)[:2]
             self.eval_frame(frame_id, trk_tlwhs, trk_ids, rtn_events=False)
 
         return self.acc
 
     @staticmethod
-    def get_summary(accs, names, metrics=('mota', 'num_switches', 'idp', 'idr', 'idf1', 'precision', 'recall')):
+    def eval_many(data_root, seq_names, filenames, data_type='mot', processes=None, cache=True, **summary_kwargs):
+        """
+        在进程池中并行评估多个序列，filenames 为与 seq_names 一一对应的结果文件，返回 get_summary 的汇总表。\n
+        processes 为进程数（None 时为CPU核数，1 时在当前进程中串行执行）；cache 为 True 时gt解析结果保存为
+        gt.txt.npy 二进制缓存，各工作进程以及之后的调用都从磁盘加载，不再重新解析文本
+        （进程池每次调用新建，进程内不保留状态）。标注文件较大的序列先提交，减少最后只剩一个序列在运行的时间。\n
+        summary_kwargs 传给 get_summary（如 metrics）。
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        tasks = [(data_root, seq_name, data_type, filename, cache) for seq_name, filename in zip(seq_names, filenames)]
+        def gt_size(task):
+            gt_filename = os.path.join(data_root, task[1], 'gt', 'gt.txt')
+            return os.path.getsize(gt_filename) if os.path.isfile(gt_filename) else 0
+        order = sorted(range(len(tasks)), key=lambda i: -gt_size(tasks[i]))
+
+        accs = [None] * len(tasks)
+        if processes == 1 or len(tasks) <= 1:
+            for i in order:
+                accs[i] = _eval_sequence(*tasks[i])
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = {i: executor.submit(_eval_sequence, *tasks[i]) for i in order}
+                for i, future in futures.items():
+                    accs[i] = future.result()
+        return Evaluator.get_summary(accs, list(seq_names), **summary_kwargs)
+
+    @staticmethod
+    def get_summary(accs, names, metrics=('mota', 'num_switches', 'idp', 'idr', 'idf1', 'precision', 'recall'),
+                    reid_stats=None):
+        """reid_stats: 可选，与names一一对应的 DeepSort.reid_stats 列表；
+        给出时在汇总表中附加ReID特征提取/复用数量及节省比例，便于与num_switches一起比较特征复用策略"""
         names = copy.deepcopy(names)
         if metrics is None:
             metrics = mm.metrics.motchallenge_metrics
@@ -93,6 +130,15 @@ class Evaluator(object):
             generate_overall=True
         )
 
+        if reid_stats is not None:
+            extracted = [stats['extracted'] for stats in reid_stats]
+            reused = [stats['reused'] for stats in reid_stats]
+            extracted.append(sum(extracted))
+            reused.append(sum(reused))
+            summary['reid_extracted'] = extracted
+            summary['reid_reused'] = reused
+            summary['reid_saved'] = [r / max(e + r, 1) for e, r in zip(extracted, reused)]
+
         return summary
 
     @staticmethod
@@ -1,3 +1,4 @@
+import glob
 import os
 from typing import Dict
 import numpy as np
@@ -5,25 +6,133 @@ import numpy as np
 # from utils.log import get_logger
 
 
-def write_results(filename, results, data_type):
-    if data_type == 'mot':
-        save_format = '{frame},{id},{x1},{y1},{w},{h},-1,-1,-1,-1\n'
-    elif data_type == 'kitti':
-        save_format = '{frame} {id} pedestrian 0 0 -10 {x1} {y1} {x2} {y2} -10 -10 -10 -1000 -1000 -1000 -10\n'
-    else:
-        raise ValueError(data_type)
+_TEXT_FORMATS = {
+    'mot': '%d,%d,%s,%s,%s,%s,-1,-1,-1,-1\n',
+    'kitti': '%d %d pedestrian 0 0 -10 %s %s %s %s -10 -10 -10 -1000 -1000 -1000 -10\n',
+}
+_COLUMNS = ('frame', 'id', 'x1', 'y1', 'w', 'h')
+
+
+def _chunk_prefix(filename):
+    return os.path.splitext(filename)[0]
+
+
+def _chunk_file(filename, index):
+    return '{}_{:05d}.npy'.format(_chunk_prefix(filename), index)
+
+
+class ResultsWriter(object):
+    """
+    增量写出跟踪结果：每帧调用 write()，结果先缓存在内存中，累计 flush_rows 行后写入文件，内存占用有上限。\n
+    data_type：\n
+    'mot' / 'kitti'：文本格式，与 write_results 的输出一致；\n
+    'npy'：每次刷新写一个 (K,6) float64 数组 [frame, id, x1, y1, w, h] 到 filename_00000.npy, filename_00001.npy, ...，
+    用 load_results_chunks 读回；打开时删除同一前缀下已有的分块，避免与上一次运行的结果混在一起；\n
+    'parquet'：每次刷新写一个row group，列为 frame, id, x1, y1, w, h（需要 pyarrow）。
+    """
+    def __init__(self, filename, data_type='mot', flush_rows=65536):
+        if data_type not in ('mot', 'kitti', 'npy', 'parquet'):
+            raise ValueError(data_type)
+        path = os.path.dirname(filename)
+        if path:
+            os.makedirs(path, exist_ok=True)
+        self.filename = filename
+        self.data_type = data_type
+        self.flush_rows = flush_rows
+        self.rows = 0 # 已写入的总行数
+        self._pending = [] # 文本格式为字符串块，其余为 (K,6) 数组
+        self._pending_rows = 0
+        self._chunk = 0
+        self._file = None
+        self._parquet = None
+        if data_type in _TEXT_FORMATS:
+            self._file = open(filename, 'w')
+        elif data_type == 'npy':
+            for chunk_file in glob.glob(glob.escape(_chunk_prefix(filename)) + '_[0-9][0-9][0-9][0-9][0-9].npy'):
+                os.remove(chunk_file)
+
+    def write(self, frame_id, tlwhs, track_ids):
+        """追加一帧的结果，track_id < 0 的目标被忽略"""
+        track_ids = np.asarray(track_ids).reshape(-1)
+        tlwhs = np.asarray(tlwhs).reshape(-1, 4)
+        keep = track_ids >= 0
+        tlwhs, track_ids = tlwhs[keep], track_ids[keep]
+        if not len(track_ids):
+            return
+        if self.data_type in _TEXT_FORMATS:
+            self._pending.append(self._format(frame_id, tlwhs, track_ids))
+        else:
+            rows = np.empty((len(track_ids), 6), dtype=np.float64)
+            rows[:, 0] = frame_id
+            rows[:, 1] = track_ids
+            rows[:, 2:] = tlwhs
+            self._pending.append(rows)
+        self._pending_rows += len(track_ids)
+        if self._pending_rows >= self.flush_rows:
+            self.flush()
+
+    def _format(self, frame_id, tlwhs, track_ids):
+        # 一帧的所有行用一次 % 格式化；坐标保持原有类型（整数不会写成 '12.0'）
+        if self.data_type == 'kitti':
+            frame_id -= 1
+            tlwhs = np.hstack([tlwhs[:, :2], tlwhs[:, :2] + tlwhs[:, 2:]])
+        values = np.empty((len(track_ids), 6), dtype=object)
+        values[:, 0] = int(frame_id)
+        values[:, 1] = track_ids.tolist()
+        values[:, 2:] = tlwhs.tolist()
+        return (_TEXT_FORMATS[self.data_type] * len(track_ids)) % tuple(values.ravel())
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self.data_type in _TEXT_FORMATS:
+            self._file.write(''.join(self._pending))
+            self._file.flush()
+        elif self.data_type == 'npy':
+            np.save(_chunk_file(self.filename, self._chunk), np.concatenate(self._pending))
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            rows = np.concatenate(self._pending)
+            table = pa.table({name: rows[:, i].astype(np.int64) if i < 2 else rows[:, i]
+                              for i, name in enumerate(_COLUMNS)})
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.filename, table.schema)
+            self._parquet.write_table(table)
+        self._chunk += 1
+        self.rows += self._pending_rows
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
-    with open(filename, 'w') as f:
+def load_results_chunks(filename):
+    """读回 ResultsWriter 以 'npy' 格式写出的所有分块，返回 (N,6) 数组 [frame, id, x1, y1, w, h]"""
+    chunks = []
+    while os.path.isfile(_chunk_file(filename, len(chunks))):
+        chunks.append(np.load(_chunk_file(filename, len(chunks))))
+    return np.concatenate(chunks) if chunks else np.empty((0, 6))
+
+
+def write_results(filename, results, data_type):
+    """一次性写出 [(frame_id, tlwhs, track_ids), ...]；长时间运行时直接使用 ResultsWriter 逐帧写出"""
+    with ResultsWriter(filename, data_type) as writer:
         for frame_id, tlwhs, track_ids in results:
-            if data_type == 'kitti':
-                frame_id -= 1
-            for tlwh, track_id in zip(tlwhs, track_ids):
-                if track_id < 0:
-                    continue
-                x1, y1, w, h = tlwh
-                x2, y2 = x1 + w, y1 + h
-                line = save_format.format(frame=frame_id, id=track_id, x1=x1, y1=y1, x2=x2, y2=y2, w=w, h=h)
-                f.write(line)
+            writer.write(frame_id, tlwhs, track_ids)
 
 
 # def write_results(filename, results_dict: Dict, data_type: str):
@@ -54,13 +163,17 @@ def write_results(filename, results, data_type):
 #     logger.info('Save results to {}'.format(filename))
 
 
-def read_results(filename, data_type: str, is_gt=False, is_ignore=False):
+def read_results(filename, data_type: str, is_gt=False, is_ignore=False, as_arrays=False, cache=False):
+    """
+    as_arrays 为 True 时返回 {frame: (tlwhs (K,4), ids (K,), scores (K,))}，否则返回 {frame: [(tlwh, id, score), ...]}；
+    cache 为 True 时使用 load_mot_array 的二进制缓存
+    """
     if data_type in ('mot', 'lab'):
-        read_fun = read_mot_results
+        read_fun = read_mot_frames if as_arrays else read_mot_results
     else:
         raise ValueError('Unknown data type: {}'.format(data_type))
 
-    return read_fun(filename, is_gt, is_ignore)
+    return read_fun(filename, is_gt, is_ignore, cache=cache)
 
 
 """
@@ -81,45 +194,89 @@ labels={'ped', ...			% 1
 """
 
 
-def read_mot_results(filename, is_gt, is_ignore):
-    valid_labels = {1}
-    ignore_labels = {2, 7, 8, 12}
-    results_dict = dict()
-    if os.path.isfile(filename):
+def load_mot_array(filename, cache=False):
+    """
+    把MOT格式的文本文件整体解析为 (N,10) float64 数组，列数不足10的行以 NaN 补齐，少于7列的行被丢弃；文件不存在时返回空数组。\n
+    cache 为 True 时把解析结果保存为 filename + '.npy'，之后文本未修改时以内存映射方式直接加载缓存。
+    """
+    if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+        return np.empty((0, 10))
+    cache_file = filename + '.npy'
+    if cache and os.path.isfile(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(filename):
+        return np.load(cache_file, mmap_mode='r')
+
+    try:
+        data = np.loadtxt(filename, delimiter=',', ndmin=2)
+    except ValueError:
+        # 各行列数不一致时逐行解析
         with open(filename, 'r') as f:
-            for line in f.readlines():
-                linelist = line.split(',')
-                if len(linelist) < 7:
-                    continue
-                fid = int(linelist[0])
-                if fid < 1:
-                    continue
-                results_dict.setdefault(fid, list())
-
-                if is_gt:
-                    if 'MOT16-' in filename or 'MOT17-' in filename:
-                        label = int(float(linelist[7]))
-                        mark = int(float(linelist[6]))
-                        if mark == 0 or label not in valid_labels:
-                            continue
-                    score = 1
-                elif is_ignore:
-                    if 'MOT16-' in filename or 'MOT17-' in filename:
-                        label = int(float(linelist[7]))
-                        vis_ratio = float(linelist[8])
-                        if label not in ignore_labels and vis_ratio >= 0:
-                            continue
-                    else:
-                        continue
-                    score = 1
-                else:
-                    score = float(linelist[6])
-
-                tlwh = tuple(map(float, linelist[2:6]))
-                target_id = int(linelist[1])
-
-                results_dict[fid].append((tlwh, target_id, score))
+            rows = [line.split(',') for line in f]
+        data = np.full((len(rows), 10), np.nan)
+        for i, row in enumerate(rows):
+            values = [float(v) for v in row[:10]] if len(row) >= 7 else []
+            data[i, :len(values)] = values
+    if data.shape[1] < 7:
+        data = np.empty((0, 10))
+    elif data.shape[1] < 10:
+        data = np.hstack([data, np.full((len(data), 10 - data.shape[1]), np.nan)])
+    data = data[:, :10]
+    data = data[~np.isnan(data[:, 6])]
+
+    if cache:
+        try:
+            np.save(cache_file, data)
+        except OSError:
+            pass
+    return data
+
+
+def read_mot_frames(filename, is_gt, is_ignore, cache=False):
+    """
+    与 read_mot_results 的筛选规则相同，但每帧的结果为数组 (tlwhs (K,4), ids (K,), scores (K,))。\n
+    整个文件一次解析，按帧号稳定排序后用 np.split 分组；文件中出现过的帧即使所有目标都被筛掉也保留为空数组。
+    """
+    valid_labels = [1]
+    ignore_labels = [2, 7, 8, 12]
+    data = load_mot_array(filename, cache)
+    data = data[data[:, 0] >= 1]
+    fids = data[:, 0].astype(int)
 
+    is_mot = 'MOT16-' in filename or 'MOT17-' in filename
+    if is_gt:
+        keep = np.ones(len(data), dtype=bool)
+        if is_mot:
+            keep = (data[:, 6].astype(int) != 0) & np.isin(data[:, 7].astype(int), valid_labels)
+        scores = np.ones(len(data))
+    elif is_ignore:
+        keep = np.zeros(len(data), dtype=bool)
+        if is_mot:
+            keep = np.isin(data[:, 7].astype(int), ignore_labels) | (data[:, 8] < 0)
+        scores = np.ones(len(data))
+    else:
+        keep = np.ones(len(data), dtype=bool)
+        scores = data[:, 6]
+
+    all_frames = np.unique(fids)
+    order = np.argsort(fids[keep], kind='stable')
+    kept_fids = fids[keep][order]
+    tlwhs = np.ascontiguousarray(data[keep][order, 2:6])
+    ids = data[keep][order, 1].astype(int)
+    scores = np.asarray(scores[keep][order], dtype=float)
+    frames, starts = np.unique(kept_fids, return_index=True)
+
+    results_dict = {int(fid): (np.empty((0, 4)), np.empty(0, dtype=int), np.empty(0)) for fid in all_frames}
+    for fid, frame_tlwhs, frame_ids, frame_scores in zip(frames, np.split(tlwhs, starts[1:]),
+                                                         np.split(ids, starts[1:]), np.split(scores, starts[1:])):
+        results_dict[int(fid)] = (frame_tlwhs, frame_ids, frame_scores)
+    return results_dict
+
+
+def read_mot_results(filename, is_gt, is_ignore, cache=False):
+    """{frame: [(tlwh, id, score), ...]}，由 read_mot_frames 的结果转换而来"""
+    results_dict = dict()
+    for fid, (tlwhs, ids, scores) in read_mot_frames(filename, is_gt, is_ignore, cache).items():
+        results_dict[fid] = [(tuple(tlwh), target_id, score)
+                             for tlwh, target_id, score in zip(tlwhs.tolist(), ids.tolist(), scores.tolist())]
     return results_dict
 
 
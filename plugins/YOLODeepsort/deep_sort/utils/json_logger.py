@@ -3,11 +3,17 @@ References:
     https://medium.com/analytics-vidhya/creating-a-custom-logging-mechanism-for-real-time-object-detection-using-tdd-4ca2cfcd0a2f
 """
 import json
+from glob import glob
 from os import makedirs
-from os.path import exists, join
+from os.path import exists, isdir, join
 from datetime import datetime
 
 
+def _to_json(value):
+    # numpy scalars (track ids, coordinates) are not serializable by default
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
 class JsonMeta(object):
     HOURS = 3
     MINUTES = 59
@@ -24,9 +30,11 @@ class BaseJsonLogger(object):
     """
 
     def dic(self):
-        # returns dicts of objects
+        # returns dicts of objects, private attributes (indexes, file handles) are skipped
         out = {}
         for k, v in self.__dict__.items():
+            if k.startswith('_'):
+                continue
             if hasattr(v, 'dic'):
                 out[k] = v.dic()
             elif isinstance(v, list):
@@ -111,19 +119,25 @@ class Frame(BaseJsonLogger):
         self.frame_id = frame_id
         self.timestamp = timestamp
         self.bboxes = []
+        self._bbox_index = {}  # bbox_id -> Bbox, O(1) lookup
+
+    def has_bbox(self, bbox_id: int) -> bool:
+        return bbox_id in self._bbox_index
+
+    def get_bbox(self, bbox_id: int):
+        return self._bbox_index.get(bbox_id)
 
     def add_bbox(self, bbox_id: int, top: int, left: int, width: int, height: int):
-        bboxes_ids = [bbox.bbox_id for bbox in self.bboxes]
-        if bbox_id not in bboxes_ids:
-            self.bboxes.append(Bbox(bbox_id, top, left, width, height))
+        if bbox_id not in self._bbox_index:
+            bbox = Bbox(bbox_id, top, left, width, height)
+            self.bboxes.append(bbox)
+            self._bbox_index[bbox_id] = bbox
         else:
             raise ValueError("Frame with id: {} already has a Bbox with id: {}".format(self.frame_id, bbox_id))
 
     def add_label_to_bbox(self, bbox_id: int, category: str, confidence: float):
-        bboxes = {bbox.id: bbox for bbox in self.bboxes}
-        if bbox_id in bboxes.keys():
-            res = bboxes.get(bbox_id)
-            res.add_label(category, confidence)
+        if bbox_id in self._bbox_index:
+            self._bbox_index[bbox_id].add_label(category, confidence)
         else:
             raise ValueError('the bbox with id: {} does not exists!'.format(bbox_id))
 
@@ -219,10 +233,7 @@ class BboxToJsonLogger(BaseJsonLogger):
         Returns:
             bool: if bbox exists in frame bboxes list
         """
-        bboxes = []
-        if self.frame_exists(frame_id=frame_id):
-            bboxes = [bbox.bbox_id for bbox in self.frames[frame_id].bboxes]
-        return bbox_id in bboxes
+        return self.frame_exists(frame_id=frame_id) and self.frames[frame_id].has_bbox(bbox_id)
 
     def find_bbox(self, frame_id: int, bbox_id: int):
         """
@@ -239,8 +250,7 @@ class BboxToJsonLogger(BaseJsonLogger):
         """
         if not self.bbox_exists(frame_id, bbox_id):
             raise ValueError("frame with id: {} does not contain bbox with id: {}".format(frame_id, bbox_id))
-        bboxes = {bbox.bbox_id: bbox for bbox in self.frames[frame_id].bboxes}
-        return bboxes.get(bbox_id)
+        return self.frames[frame_id].get_bbox(bbox_id)
 
     def add_bbox_to_frame(self, frame_id: int, bbox_id: int, top: int, left: int, width: int, height: int) -> None:
         """
@@ -262,7 +272,7 @@ class BboxToJsonLogger(BaseJsonLogger):
         """
         if self.frame_exists(frame_id):
             frame = self.frames[frame_id]
-            if not self.bbox_exists(frame_id, bbox_id):
+            if not frame.has_bbox(bbox_id):
                 frame.add_bbox(bbox_id, top, left, width, height)
             else:
                 raise ValueError(
@@ -317,7 +327,7 @@ class BboxToJsonLogger(BaseJsonLogger):
         if not output_name.endswith('.json'):
             output_name += '.json'
         with open(output_name, 'w') as file:
-            json.dump(self.output(), file)
+            json.dump(self.output(), file, default=_to_json)
         file.close()
 
     def set_start(self):
@@ -358,12 +368,18 @@ class BboxToJsonLogger(BaseJsonLogger):
     def schedule_output_by_frames(self, frames_quota, frame_counter, output_dir=JsonMeta.PATH_TO_SAVE):
         """
         saves as the number of frames quota increases higher.
-        :param frames_quota:
-        :param frame_counter:
+        :param frames_quota: number of frames kept in memory before they are written out
+        :param frame_counter: the current frame number, used in the output file name
         :param output_dir:
         :return:
         """
-        pass
+        if len(self.frames) >= frames_quota:
+            output_name = '{}-{}.json'.format(self.start_time.strftime('%Y-%m-%d %H-%M-%S'), frame_counter)
+            if not exists(output_dir):
+                makedirs(output_dir)
+            self.json_output(output_name=join(output_dir, output_name))
+            self.frames = {}
+            self.start_time = datetime.now()
 
     def flush(self, output_dir):
         """
@@ -381,3 +397,127 @@ class BboxToJsonLogger(BaseJsonLogger):
         filename = self.start_time.strftime('%Y-%m-%d %H-%M-%S') + '-remaining.json'
         output = join(output_dir, filename)
         self.json_output(output_name=output)
+
+
+class JsonLinesLogger(BboxToJsonLogger):
+    """
+    Append-only variant of BboxToJsonLogger. Each finished frame is written as one JSON line as soon as a newer
+    frame is added, so memory only holds the last `open_frames` frames instead of the whole video.
+    Example file:
+          {"video_details": {"frame_width": 1920, "frame_height": 1080, "frame_rate": 20, "video_name": "camera1.avi"}}
+          {"frame_id": 329, "timestamp": 3365.1254, "bboxes": [{"labels": [...], "bbox_id": 0, "top": 1257, ...}]}
+
+    Files are named after the time they were started and rotated whenever `frames_quota` frames have been
+    written or `rotate_seconds` have elapsed; every file starts with the video_details line.
+    Use `iter_frames` to read them back lazily.
+
+    Attributes:
+        frames (dict): the frames that can still be modified, in insertion order.
+        frames_written (int): number of frames written to the current file.
+
+    Args:
+        output_dir (str): the directory where .jsonl files will be stored
+        top_k_labels (int): shows the allowed number of labels
+        open_frames (int): number of most recent frames kept in memory for add_bbox_to_frame/add_label_to_bbox
+        frames_quota (int): rotate after this many frames, None to disable
+        rotate_seconds (float): rotate after this many seconds, None to disable
+
+    """
+
+    def __init__(self, output_dir=JsonMeta.PATH_TO_SAVE, top_k_labels: int = 1, open_frames: int = 1,
+                 frames_quota: int = None, rotate_seconds: float = None):
+        super().__init__(top_k_labels)
+        self.output_dir = output_dir
+        self.open_frames = max(open_frames, 1)
+        self.frames_quota = frames_quota
+        self.rotate_seconds = rotate_seconds
+        self.frames_written = 0
+        self.files = []  # paths of all files written so far
+        self._file = None
+
+    def add_frame(self, frame_id: int, timestamp: float = None) -> None:
+        super().add_frame(frame_id, timestamp)
+        while len(self.frames) > self.open_frames:
+            self._write_frame(self.frames.pop(next(iter(self.frames))))
+
+    def _open(self):
+        if not exists(self.output_dir):
+            makedirs(self.output_dir)
+        path = join(self.output_dir, self.start_time.strftime('%Y-%m-%d %H-%M-%S-%f') + '.jsonl')
+        self._file = open(path, 'w')
+        self._file.write(json.dumps({'video_details': self.video_details}, default=_to_json) + '\n')
+        self.files.append(path)
+        self.frames_written = 0
+
+    def _write_frame(self, frame):
+        if self._file is not None and self._should_rotate():
+            self.rotate()
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(frame.dic(), default=_to_json) + '\n')
+        self.frames_written += 1
+
+    def _should_rotate(self):
+        if self.frames_quota and self.frames_written >= self.frames_quota:
+            return True
+        return bool(self.rotate_seconds) and (datetime.now() - self.start_time).total_seconds() >= self.rotate_seconds
+
+    def rotate(self):
+        """Closes the current file, the next written frame starts a new one."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.start_time = datetime.now()
+
+    def schedule_output_by_time(self, output_dir=None, hours: int = 0, minutes: int = 0, seconds: int = 60) -> None:
+        """Sets the time based rotation; same arguments as BboxToJsonLogger.schedule_output_by_time."""
+        if output_dir is not None:
+            self.output_dir = output_dir
+        self.rotate_seconds = (abs(min([hours, JsonMeta.HOURS]) * 3600) + abs(min([minutes, JsonMeta.MINUTES]) * 60) +
+                               abs(min([seconds, JsonMeta.SECONDS])))
+
+    def schedule_output_by_frames(self, frames_quota, frame_counter=None, output_dir=None):
+        """Sets the frame quota based rotation."""
+        if output_dir is not None:
+            self.output_dir = output_dir
+        self.frames_quota = frames_quota
+
+    def flush(self, output_dir=None):
+        """Writes the frames still held in memory and closes the current file."""
+        if output_dir is not None:
+            self.output_dir = output_dir
+        while self.frames:
+            self._write_frame(self.frames.pop(next(iter(self.frames))))
+        if self._file is not None:
+            self._file.flush()
+        self.rotate()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_frames(path):
+    """
+    Lazily yields the frame dicts written by JsonLinesLogger, one line at a time.
+
+    Args:
+        path (str): a .jsonl file, or a directory whose .jsonl files are read in name (i.e. time) order
+
+    Yields:
+        dict: {"frame_id", "timestamp", "bboxes"}; video_details lines are skipped
+    """
+    paths = sorted(glob(join(path, '*.jsonl'))) if isdir(path) else [path]
+    for file_path in paths:
+        with open(file_path, 'r') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'video_details' not in record:
+                    yield record
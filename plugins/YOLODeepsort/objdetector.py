@@ -1,9 +1,52 @@
+import numpy as np
 import torch
-from ultralytics import YOLO
 
 OBJ_LIST = ['person', 'car', 'bus', 'truck']
 DETECTOR_PATH = './weights/YOLOv8\yolov8x_UAV.pt'
 
+
+class FrameDetections(object):
+    """
+    一帧的检测结果，各字段为连续的NumPy数组，从检测器一直传到 DeepSort.update，不构造逐框的Python对象：\n
+    - xyxy: (N, 4) float32\n
+    - conf: (N,) float32\n
+    - cls: (N,) int64，类别未知时为 -1\n
+    - xywh: (N, 4) float32，中心点坐标按 int((x1+x2)/2) 的方式取整，首次访问时计算
+    """
+    __slots__ = ('xyxy', 'conf', 'cls', '_xywh')
+
+    def __init__(self, xyxy, conf, cls=None, xywh=None):
+        self.xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.full(len(self.conf), -1, dtype=np.int64) if cls is None else np.asarray(cls, dtype=np.int64)
+        self._xywh = xywh
+
+    @classmethod
+    def from_boxes(cls, bboxes):
+        """由 [(x1, y1, x2, y2, lbl, conf), ...] 形式的检测结果构造，类别记为 -1"""
+        if not len(bboxes):
+            return cls(np.zeros((0, 4)), np.zeros(0))
+        xyxy = np.array([bbox[:4] for bbox in bboxes], dtype=np.float64)
+        conf = np.array([float(bbox[5]) for bbox in bboxes])
+        # 按输入精度计算后再转为 float32，与逐框转换的结果一致
+        return cls(xyxy, conf, xywh=cls._xyxy_to_xywh(xyxy).astype(np.float32))
+
+    @staticmethod
+    def _xyxy_to_xywh(xyxy):
+        bbox_xywh = np.empty_like(xyxy)
+        bbox_xywh[:, :2] = np.trunc((xyxy[:, :2] + xyxy[:, 2:]) / 2)
+        bbox_xywh[:, 2:] = xyxy[:, 2:] - xyxy[:, :2]
+        return bbox_xywh
+
+    @property
+    def xywh(self):
+        if self._xywh is None:
+            self._xywh = self._xyxy_to_xywh(self.xyxy)
+        return self._xywh
+
+    def __len__(self):
+        return len(self.conf)
+
 class baseDet(object):
     def __init__(self):
         self.img_size = 640
@@ -26,30 +69,50 @@ class Detector(baseDet):
         self.init_model(weight_path)
 
     def init_model(self, weight_path):
+        from ultralytics import YOLO
+
         self.weights = weight_path
         self.device = 0 if torch.cuda.is_available() else 'cpu'
         self.model = YOLO(self.weights)
         self.m = self.model
         self.names = self.model.module.names if hasattr(self.model, 'module') else self.model.names
+        # OBJ_LIST 在初始化时映射为类别id：推理时只让模型保留这些类别（NMS处理的框更少），
+        # 结果再用按类别id索引的掩码过滤，不再逐框查表比较字符串
+        self.class_ids = [i for i, name in self.names.items() if name in OBJ_LIST]
+        self._class_mask = np.zeros(max(self.names) + 1, dtype=bool)
+        self._class_mask[self.class_ids] = True
+        self._labels = np.array([self.names.get(i, '') for i in range(len(self._class_mask))], dtype=object)
+
+    def _predict(self, source):
+        return self.model.predict(source, imgsz=self.img_size, conf=self.conf, iou=self.iou, classes=self.class_ids,
+                                  device=self.device, verbose=False, line_width=2)
+
+    def detect_frame(self, im):
+        """返回一帧的 FrameDetections"""
+        return self._to_frame(self._predict(im)[0])
+
+    def detect_frames(self, images):
+        """多路视频流的帧合并为一个batch做一次推理，返回每帧的 FrameDetections 列表"""
+        return [self._to_frame(r) for r in self._predict(list(images))]
 
     def detect(self, im):
-        res = self.model.predict(im, imgsz=self.img_size, conf=self.conf,
-                                     iou=self.iou, device=self.device, verbose=False, line_width=2)
-                    
-        detected_boxes = res[0].boxes
-        pred_boxes = []
-        for box in detected_boxes:
-            xyxy = box.xyxy.cpu() 
-            #print(xyxy)
-            confidence = box.conf.cpu() 
-            class_id = box.cls  # get the class id
-            class_id_cpu = class_id.cpu()  # move the value to CPU
-            class_id_int = int(class_id_cpu.item())  # convert to integer
-            lbl = self.names[class_id_int]
-            if not lbl in OBJ_LIST:
-                continue
-            x1, y1, x2, y2 = xyxy[0].numpy()
-            pred_boxes.append(
-                 (x1, y1, x2, y2, lbl, confidence))
-        return im, pred_boxes
+        return im, self._to_boxes(self.detect_frame(im))
+
+    def detect_batch(self, images):
+        """多路视频流的帧合并为一个batch做一次推理，返回每帧的检测结果列表"""
+        return images, [self._to_boxes(dets) for dets in self.detect_frames(images)]
+
+    def labels(self, dets):
+        """FrameDetections 中各框的类别名称"""
+        return self._labels[dets.cls]
+
+    def _to_frame(self, result):
+        # boxes.data 为 (N, 6) 的 [x1, y1, x2, y2, conf, cls]，整体一次拷贝到CPU
+        data = result.boxes.data.cpu().numpy()
+        cls = data[:, 5].astype(np.int64)
+        keep = self._class_mask[cls]
+        return FrameDetections(data[keep, :4], data[keep, 4], cls[keep])
 
+    def _to_boxes(self, dets):
+        """转换为 [(x1, y1, x2, y2, lbl, conf), ...] 的列表形式"""
+        return [(x1, y1, x2, y2, lbl, c) for (x1, y1, x2, y2), lbl, c in zip(dets.xyxy, self.labels(dets), dets.conf)]
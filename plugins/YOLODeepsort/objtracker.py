@@ -1,82 +1,404 @@
 from deep_sort.utils.parser import get_config
-from deep_sort.deep_sort import DeepSort
+from deep_sort.deep_sort import DeepSort, get_reid_model_path
+from objdetector import FrameDetections
+from render import BoxRenderer
 import torch
-import cv2
 import numpy as np
 import os
+import math
+import queue
+import threading
+import time
 current_dir = os.path.dirname(os.path.abspath(__file__))
 # 根据当前模块位置构建deep_sort.yaml的相对路径
 config_file_path = os.path.join(current_dir, "deep_sort/configs/deep_sort.yaml")
-cfg = get_config()
-cfg.merge_from_file(config_file_path)
-deepsort = DeepSort(os.path.join(current_dir, cfg.DEEPSORT.REID_CKPT),
-                    max_dist=cfg.DEEPSORT.MAX_DIST, min_confidence=cfg.DEEPSORT.MIN_CONFIDENCE,
-                    nms_max_overlap=cfg.DEEPSORT.NMS_MAX_OVERLAP, max_iou_distance=cfg.DEEPSORT.MAX_IOU_DISTANCE,
-                    max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET,
-                    use_cuda=True)
+
+
+class TrackerFactory(object):
+    """
+    DeepSort 跟踪器的惰性工厂，导入本模块时不读取配置也不加载模型。\n
+    生命周期：create() 创建跟踪器（首次调用时才加载ReID模型，之后的跟踪器共享该模型）；
+    warm() 提前加载模型并做一次前向预热；reset(tracker) 清空跟踪状态而不重新加载权重；
+    release() 释放ReID模型。\n
+    overrides 中的键值（如 MAX_AGE=30）覆盖 deep_sort.yaml 中 DEEPSORT 下的同名配置。
+    """
+    def __init__(self, config_file=config_file_path, use_cuda=True, **overrides):
+        self.config_file = config_file
+        self.use_cuda = use_cuda
+        self.overrides = overrides
+        self._cfg = None
+        self.extractor = None
+
+    @property
+    def cfg(self):
+        if self._cfg is None:
+            self._cfg = get_config()
+            self._cfg.merge_from_file(self.config_file)
+            self._cfg.DEEPSORT.update(self.overrides)
+        return self._cfg
+
+    def create(self):
+        cfg = self.cfg
+        tracker = DeepSort(os.path.join(current_dir, get_reid_model_path(cfg)),
+                           max_dist=cfg.DEEPSORT.MAX_DIST, min_confidence=cfg.DEEPSORT.MIN_CONFIDENCE,
+                           nms_max_overlap=cfg.DEEPSORT.NMS_MAX_OVERLAP, max_iou_distance=cfg.DEEPSORT.MAX_IOU_DISTANCE,
+                           max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET,
+                           use_cuda=self.use_cuda, reid_reuse_iou=cfg.DEEPSORT.REID_REUSE_IOU,
+                           reid_reuse_frames=cfg.DEEPSORT.REID_REUSE_FRAMES, reid_backend=cfg.DEEPSORT.REID_BACKEND,
+                           extractor=self.extractor)
+        self.extractor = tracker.extractor
+        return tracker
+
+    def warm(self, batch_size=1):
+        """加载ReID模型并用空白图片做一次前向，避免第一帧承担初始化开销"""
+        if self.extractor is None:
+            self.create()
+        self.extractor([np.zeros((128, 64, 3), dtype=np.uint8)] * batch_size)
+
+    def reset(self, tracker):
+        tracker.reset()
+        return tracker
+
+    def release(self):
+        """释放ReID模型，已创建的跟踪器仍持有对模型的引用，应一并丢弃"""
+        self.extractor = None
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+default_factory = TrackerFactory()
+_default_tracker = None
+
+
+def get_deepsort():
+    """返回 update() 使用的默认跟踪器，首次调用时创建"""
+    global _default_tracker
+    if _default_tracker is None:
+        _default_tracker = default_factory.create()
+    return _default_tracker
+
+
+def reset_deepsort():
+    """开始处理新视频前清空默认跟踪器的状态，不重新加载权重"""
+    if _default_tracker is not None:
+        default_factory.reset(_default_tracker)
+
+
+def release_deepsort():
+    """释放默认跟踪器及其ReID模型，下次调用 update() 时重新创建"""
+    global _default_tracker
+    _default_tracker = None
+    default_factory.release()
+
+
+def __getattr__(name):
+    # 兼容旧代码中的 objtracker.deepsort
+    if name == 'deepsort':
+        return get_deepsort()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# 所有跟踪入口共用的绘制器，可整体修改线宽或关闭绘制
+renderer = BoxRenderer()
 
 
 def plot_bboxes(image, bboxes, line_thickness=None):
-    # Plots one bounding box on image img
-    tl = line_thickness or round(
-        0.001 * (image.shape[0] + image.shape[1]) / 2) + 1  # line/font thickness
-    list_pts = []
-    point_radius = 4
-    
-    for (x1, y1, x2, y2, cls_id, pos_id) in bboxes:
-        if cls_id in ['smoke', 'phone', 'eat']:
-            color = (0, 0, 255)
-        else:
-            color = (0, 255, 0)
-        if cls_id == 'eat':
-            cls_id = 'eat-drink'
-            
-        # check whether hit line 
-        check_point_x = x1
-        check_point_y = int(y1 + ((y2 - y1) * 0.6))
-
-        c1, c2 = (x1, y1), (x2, y2)
-        cv2.rectangle(image, c1, c2, color, thickness=tl, lineType=cv2.LINE_AA)
-        tf = max(tl - 1, 1)  # font thickness
-        t_size = cv2.getTextSize(cls_id, 0, fontScale=tl / 3, thickness=tf)[0]
-        c2 = c1[0] + t_size[0], c1[1] - t_size[1] - 3
-        cv2.rectangle(image, c1, c2, color, -1, cv2.LINE_AA)  # filled
-        cv2.putText(image, '{} ID-{}'.format(cls_id, pos_id), (c1[0], c1[1] - 2), 0, tl / 3,
-                    [225, 255, 255], thickness=tf, lineType=cv2.LINE_AA)
-        list_pts.clear()            
-        list_pts.append([check_point_x-point_radius, check_point_y-point_radius])
-        list_pts.append([check_point_x-point_radius, check_point_y+point_radius])
-        list_pts.append([check_point_x+point_radius, check_point_y+point_radius])
-        list_pts.append([check_point_x+point_radius, check_point_y-point_radius])
-
-        ndarray_pts = np.array(list_pts, np.int32)
-        cv2.fillPoly(image, [ndarray_pts], color=(0, 0, 255))
-        #list_pts.clear()
-    return image
-
-def update(target_detector, image):
-        _, bboxes = target_detector.detect(image)
-        bbox_xywh = []
-        confs = []
-        bboxes2draw = []
-        if len(bboxes):
-            # Adapt detections to deep sort input format
-            for x1, y1, x2, y2, _, conf in bboxes:
-                obj = [
-                    int((x1+x2)/2), int((y1+y2)/2),
-                    x2-x1, y2-y1
-                ]
-                bbox_xywh.append(obj)
-                confs.append(conf)
-            xywhs = torch.Tensor(bbox_xywh)
-            confss = torch.Tensor(confs)
-
-            # Pass detections to deepsort
-            outputs = deepsort.update(xywhs, confss, image)
-            for value in list(outputs):
-                x1,y1,x2,y2,track_id = value
-                bboxes2draw.append(
-                    (x1, y1, x2, y2, '', track_id)
-                )
+    # Plots bounding boxes on image img
+    return renderer.draw(image, bboxes, line_thickness)
+
+
+def detect_stage(target_detector, image):
+    """检测阶段：运行检测器，返回 FrameDetections"""
+    if hasattr(target_detector, 'detect_frame'):
+        return target_detector.detect_frame(image)
+    _, bboxes = target_detector.detect(image)
+    return FrameDetections.from_boxes(bboxes)
+
+
+def track_stage(image, detections, tracker=None, render=True):
+    """跟踪阶段：ReID特征提取与关联，并绘制结果；render 为 False 时不绘制（只需要跟踪结果时）"""
+    tracker = tracker or get_deepsort()
+    bboxes2draw = []
+    if len(detections):
+        # Pass detections to deepsort
+        outputs = tracker.update(detections.xywh, detections.conf, image, detections.cls)
+        bboxes2draw = _to_bboxes2draw(outputs)
+    if render:
         image = plot_bboxes(image, bboxes2draw)
-        return image, bboxes2draw
+    return image, bboxes2draw
+
+
+def _to_bboxes2draw(outputs):
+    return [(x1, y1, x2, y2, '', track_id) for x1, y1, x2, y2, track_id in list(outputs)]
+
+
+def update(target_detector, image, render=True):
+        return track_stage(image, detect_stage(target_detector, image), render=render)
+
+
+class AdaptiveStride(object):
+    """
+    检测间隔控制：每 stride 帧运行一次检测和ReID，其余帧只用卡尔曼滤波预测轨迹（DeepSort.coast）。\n
+    每次检测后重新选择 stride：\n
+    - 运动约束：按确认态轨迹的速度和位置标准差（相对框高）估计预测框的漂移，取漂移不超过 drift_budget 的最大间隔；
+      静止的场景可以少做检测；存在未确认的轨迹或没有本次匹配上的确认态轨迹（包括没有任何轨迹）时按 min_stride 检测，
+      让新出现的目标尽快完成确认，未确认的轨迹也不会因为跳过检测而被删除。\n
+    - 帧率约束：给出 target_fps 时，按实测的检测帧和预测帧耗时计算达到目标帧率所需的最小间隔，作为下限。\n
+    min_stride == max_stride 时为固定间隔。
+    """
+    def __init__(self, min_stride=1, max_stride=4, target_fps=None, drift_budget=0.25):
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.target_fps = target_fps
+        self.drift_budget = drift_budget
+        self.stride = min_stride
+        self._since_detect = None # 距上次检测的帧数，None 表示下一帧必须检测
+        self._detect_time = None # 检测帧与预测帧耗时的滑动平均（秒）
+        self._coast_time = None
+
+    def reset(self):
+        self.stride = self.min_stride
+        self._since_detect = None
+
+    def should_detect(self):
+        return self._since_detect is None or self._since_detect >= self.stride
+
+    def record(self, detected, seconds, tracker):
+        """记录本帧的类型和耗时；检测帧之后按 tracker 中的轨迹状态更新 stride"""
+        if detected:
+            self._detect_time = seconds if self._detect_time is None else 0.9 * self._detect_time + 0.1 * seconds
+            self._since_detect = 1
+            self.stride = int(np.clip(max(self._motion_stride(tracker), self._fps_stride()),
+                                      self.min_stride, self.max_stride))
+        else:
+            self._coast_time = seconds if self._coast_time is None else 0.9 * self._coast_time + 0.1 * seconds
+            self._since_detect += 1
+
+    def _motion_stride(self, tracker):
+        if any(track.is_tentative() for track in tracker.tracker.tracks):
+            return self.min_stride
+        tracks = [track for track in tracker.tracker.tracks
+                  if track.is_confirmed() and track.time_since_update == 0]
+        if not tracks:
+            return self.min_stride
+        mean = np.array([track.mean for track in tracks])
+        covariance = np.array([track.covariance for track in tracks])
+        height = np.maximum(mean[:, 3], 1.)
+        speed = np.hypot(mean[:, 4], mean[:, 5]) / height # 每帧的位移（相对框高）
+        std = np.sqrt(covariance[:, 0, 0] + covariance[:, 1, 1]) / height
+        strides = np.floor((self.drift_budget - std) / np.maximum(speed, 1e-6))
+        return int(max(strides.min(), 1))
+
+    def _fps_stride(self):
+        if not self.target_fps or self._detect_time is None:
+            return self.min_stride
+        budget = 1. / self.target_fps
+        coast_time = self._coast_time or 0.
+        if self._detect_time <= budget:
+            return self.min_stride
+        if coast_time >= budget:
+            return self.max_stride
+        # (detect + (s-1)*coast) / s <= budget
+        return math.ceil((self._detect_time - coast_time) / (budget - coast_time))
+
+
+def update_adaptive(target_detector, image, stride, tracker=None, render=True):
+    """按 stride（AdaptiveStride）决定本帧运行检测跟踪还是只做卡尔曼预测，返回值同 update()"""
+    tracker = tracker or get_deepsort()
+    start = time.perf_counter()
+    detected = stride.should_detect()
+    if detected:
+        image, bboxes2draw = track_stage(image, detect_stage(target_detector, image), tracker, render)
+    else:
+        bboxes2draw = _to_bboxes2draw(tracker.coast(image))
+        if render:
+            image = plot_bboxes(image, bboxes2draw)
+    stride.record(detected, time.perf_counter() - start, tracker)
+    return image, bboxes2draw
+
+
+class LatencyHistogram(object):
+    """按对数间隔分桶的延迟直方图（单位：毫秒）"""
+    def __init__(self, edges_ms=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)):
+        self.edges_ms = np.asarray(edges_ms, dtype=np.float64)
+        self.counts = np.zeros(len(edges_ms) + 1, dtype=np.int64)
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        ms = seconds * 1e3
+        with self._lock:
+            self.counts[np.searchsorted(self.edges_ms, ms, side='right')] += 1
+            self.samples.append(ms)
+
+    def summary(self):
+        """返回 {'count', 'mean', 'p50', 'p90', 'p99'}（毫秒）"""
+        with self._lock:
+            samples = np.asarray(self.samples)
+        if len(samples) == 0:
+            return {'count': 0}
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        return {'count': len(samples), 'mean': samples.mean(), 'p50': p50, 'p90': p90, 'p99': p99}
+
+
+_STOP = object() # 流水线结束标记
+
+
+class PipelinedTracker(object):
+    """
+    流水线跟踪模式：第N+1帧的检测与第N帧的ReID特征提取和关联在两个线程中并行执行。\n
+    各阶段之间用有界队列连接，每个阶段只有一个线程，因此输出顺序与输入顺序一致。\n
+    latency 中记录 detect / track / total（提交到取得结果）各阶段的延迟直方图；render 为 False 时不绘制结果。\n
+    用法：\n
+        for image, bboxes in PipelinedTracker(detector).run(frames): ...
+    """
+    def __init__(self, target_detector, tracker=None, queue_size=2, render=True):
+        self.detector = target_detector
+        self.tracker = tracker
+        self.render = render
+        self.queue_size = queue_size
+        self.latency = {'detect': LatencyHistogram(), 'track': LatencyHistogram(), 'total': LatencyHistogram()}
+        self._frames = queue.Queue(maxsize=queue_size) # 待检测的帧
+        self._detections = queue.Queue(maxsize=queue_size) # 待跟踪的检测结果
+        self._results = queue.Queue(maxsize=queue_size) # 跟踪结果
+        self._threads = []
+        self._next_submit = 0
+        self._next_result = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._detect_loop, daemon=True),
+                         threading.Thread(target=self._track_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, image):
+        """提交一帧，队列满时阻塞"""
+        self._frames.put((self._next_submit, time.perf_counter(), image, None))
+        self._next_submit += 1
+
+    def get(self):
+        """按提交顺序取得一帧的结果 (image, bboxes2draw)，阶段中的异常在这里抛出"""
+        seq, submitted, payload, error = self._results.get()
+        if error is not None:
+            raise error
+        assert seq == self._next_result, "pipeline returned frame {} out of order".format(seq)
+        self._next_result += 1
+        self.latency['total'].record(time.perf_counter() - submitted)
+        return payload
+
+    def run(self, frames):
+        """依次产出每帧的跟踪结果；同时在途的帧数不超过 queue_size，避免各阶段互相阻塞"""
+        self.start()
+        try:
+            for image in frames:
+                self.submit(image)
+                while self._next_submit - self._next_result >= self.queue_size:
+                    yield self.get()
+            while self._next_result < self._next_submit:
+                yield self.get()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if not self._threads:
+            return
+        self._frames.put(_STOP)
+        for thread in self._threads:
+            while thread.is_alive():
+                # 丢弃未取走的结果，使阻塞在队列上的阶段线程能够退出
+                try:
+                    self._results.get_nowait()
+                except queue.Empty:
+                    pass
+                thread.join(timeout=0.05)
+        self._threads = []
+
+    def _detect_loop(self):
+        while True:
+            item = self._frames.get()
+            if item is _STOP:
+                self._detections.put(_STOP)
+                return
+            seq, submitted, image, error = item
+            payload = None
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    payload = (image, detect_stage(self.detector, image))
+                except Exception as e:
+                    error = e
+                self.latency['detect'].record(time.perf_counter() - start)
+            self._detections.put((seq, submitted, payload, error))
+
+    def _track_loop(self):
+        while True:
+            item = self._detections.get()
+            if item is _STOP:
+                return
+            seq, submitted, payload, error = item
+            result = None
+            if error is None:
+                image, detections = payload
+                start = time.perf_counter()
+                try:
+                    result = track_stage(image, detections, self.tracker, self.render)
+                except Exception as e:
+                    error = e
+                self.latency['track'].record(time.perf_counter() - start)
+            self._results.put((seq, submitted, result, error))
+
+
+class TrackerPool(object):
+    """
+    多路视频流的跟踪引擎：每个 stream_id 有独立的 DeepSort 跟踪状态，所有流共享同一个检测器和ReID模型。\n
+    update() 中各路的帧合并为一个batch送入YOLO，各路需要提取特征的框合并为一个batch送入ReID网络。\n
+    用法：\n
+        pool = TrackerPool(detector)\n
+        results = pool.update({'cam0': frame0, 'cam1': frame1})  # {stream_id: (image, bboxes2draw)}
+    """
+    def __init__(self, target_detector, factory=None):
+        self.detector = target_detector
+        self.factory = factory or default_factory # 所有流的跟踪器由同一个工厂创建，共享ReID模型
+        self.trackers = {}
+
+    def tracker(self, stream_id):
+        """返回 stream_id 对应的 DeepSort，不存在时创建"""
+        if stream_id not in self.trackers:
+            self.trackers[stream_id] = self.factory.create()
+        return self.trackers[stream_id]
+
+    def remove(self, stream_id):
+        """视频流结束后释放其跟踪状态"""
+        self.trackers.pop(stream_id, None)
+
+    def update(self, frames, render=True):
+        """frames: {stream_id: image}，返回 {stream_id: (image, bboxes2draw)}；render 为 False 时不绘制"""
+        stream_ids = list(frames)
+        images = [frames[stream_id] for stream_id in stream_ids]
+        if hasattr(self.detector, 'detect_frames'):
+            batch_detections = self.detector.detect_frames(images)
+        else:
+            _, batch_bboxes = self.detector.detect_batch(images)
+            batch_detections = [FrameDetections.from_boxes(bboxes) for bboxes in batch_bboxes]
+
+        # 各路先完成筛选与特征复用判断，需要提取特征的框汇总到一次ReID前向
+        pending = []
+        for stream_id, image, detections in zip(stream_ids, images, batch_detections):
+            if not len(detections):
+                pending.append(None)
+                continue
+            pending.append(self.tracker(stream_id).prepare(detections.xywh, detections.conf, image, detections.cls))
+        requests = [(image, p.reid_xyxy) for image, p in zip(images, pending) if p is not None]
+        # 使用池中跟踪器持有的ReID模型，factory.release() 之后工厂不再持有模型
+        extractors = [self.trackers[stream_id].extractor for stream_id, p in zip(stream_ids, pending) if p is not None]
+        features = iter(extractors[0].extract_many(requests) if requests else [])
+
+        results = {}
+        for stream_id, image, p in zip(stream_ids, images, pending):
+            bboxes2draw = []
+            if p is not None:
+                bboxes2draw = _to_bboxes2draw(self.trackers[stream_id].finish(p, next(features)))
+            results[stream_id] = (plot_bboxes(image, bboxes2draw) if render else image, bboxes2draw)
+        return results
@@ -0,0 +1,119 @@
+## 检测间隔的速度/精度权衡报告
+## 在MOT格式的数据集上分别以不同的检测间隔运行跟踪，用 Evaluator 统计 MOTA/IDF1 并记录处理帧率
+## 同时汇总ReID特征的提取/复用数量（reid_extracted/reid_reused/reid_saved），与 num_switches 一起比较特征复用策略
+
+import argparse
+import glob
+import os
+import sys
+import time
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+import cv2
+import numpy as np
+import objtracker
+from deep_sort.utils.evaluation import Evaluator
+
+
+class PublicDetector(object):
+    """使用序列自带的 det/det.txt 作为检测结果，frame_id 由调用方在每帧前设置"""
+    def __init__(self, det_file, min_conf=0.):
+        dets = np.loadtxt(det_file, delimiter=',', ndmin=2)
+        self.frames = {}
+        for row in dets[dets[:, 6] >= min_conf]:
+            x, y, w, h = row[2:6]
+            self.frames.setdefault(int(row[0]), []).append((x, y, x + w, y + h, 'person', row[6]))
+        self.frame_id = 0
+
+    def detect(self, im):
+        return im, self.frames.get(self.frame_id, [])
+
+
+def parse_strides(text):
+    """'1,2,4,auto,auto@30' -> [(名称, AdaptiveStride 或 None)]"""
+    configs = []
+    for item in text.split(','):
+        item = item.strip()
+        if item.startswith('auto'):
+            target_fps = float(item.split('@')[1]) if '@' in item else None
+            configs.append((item, lambda fps=target_fps: objtracker.AdaptiveStride(target_fps=fps)))
+        elif int(item) == 1:
+            configs.append(('stride=1', lambda: None))
+        else:
+            configs.append((f'stride={item}', lambda n=int(item): objtracker.AdaptiveStride(n, n)))
+    return configs
+
+
+def run_sequence(seq_dir, detector, stride, tracker):
+    """跟踪一个序列，返回 (每帧的 (tlwhs, ids) 列表, 跟踪耗时, 检测帧数, ReID特征提取/复用统计)"""
+    tracker.reset()
+    results = []
+    elapsed = 0.
+    detect_frames = 0
+    for frame_id, path in enumerate(sorted(glob.glob(os.path.join(seq_dir, 'img1', '*.jpg'))), start=1):
+        im = cv2.imread(path)
+        if isinstance(detector, PublicDetector):
+            detector.frame_id = frame_id
+        start = time.perf_counter()
+        if stride is None:
+            detect_frames += 1
+            _, bboxes = objtracker.track_stage(im, objtracker.detect_stage(detector, im), tracker)
+        else:
+            detect_frames += stride.should_detect()
+            _, bboxes = objtracker.update_adaptive(detector, im, stride, tracker)
+        elapsed += time.perf_counter() - start
+        boxes = np.array([bbox[:4] for bbox in bboxes], dtype=float).reshape(-1, 4)
+        boxes[:, 2:] -= boxes[:, :2]
+        results.append((frame_id, boxes, np.array([bbox[5] for bbox in bboxes], dtype=int)))
+    return results, elapsed, detect_frames, dict(tracker.reid_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测间隔的速度/精度权衡报告")
+    parser.add_argument('--data-root', required=True, help='MOT格式数据集目录，每个序列包含 img1/ 和 gt/gt.txt')
+    parser.add_argument('--seqs', nargs='+', required=True)
+    parser.add_argument('--weights', default=None, help='YOLO权重；不给出时使用序列自带的 det/det.txt')
+    parser.add_argument('--strides', default='1,2,3,4,auto', help="逗号分隔，整数为固定间隔，'auto' 或 'auto@目标帧率' 为自适应")
+    parser.add_argument('--reid-reuse-frames', type=int, default=None,
+                        help='覆盖配置中的 REID_REUSE_FRAMES，0 为不复用ReID特征')
+    parser.add_argument('--output', default=None, help='把汇总表保存为csv')
+    args = parser.parse_args()
+
+    factory = objtracker.default_factory
+    if args.reid_reuse_frames is not None:
+        factory = objtracker.TrackerFactory(REID_REUSE_FRAMES=args.reid_reuse_frames)
+    tracker = factory.create()
+    yolo = None
+    if args.weights:
+        from objdetector import Detector
+        yolo = Detector(args.weights)
+
+    rows = []
+    for name, make_stride in parse_strides(args.strides):
+        accs, fps, detect_ratio, reid_stats = [], [], [], []
+        for seq in args.seqs:
+            seq_dir = os.path.join(args.data_root, seq)
+            detector = yolo or PublicDetector(os.path.join(seq_dir, 'det', 'det.txt'))
+            results, elapsed, detect_frames, stats = run_sequence(seq_dir, detector, make_stride(), tracker)
+            reid_stats.append(stats)
+            evaluator = Evaluator(args.data_root, seq, 'mot')
+            for frame_id, tlwhs, ids in results:
+                evaluator.eval_frame(frame_id, tlwhs, ids)
+            accs.append(evaluator.acc)
+            fps.append(len(results) / max(elapsed, 1e-9))
+            detect_ratio.append(detect_frames / max(len(results), 1))
+        summary = Evaluator.get_summary(accs, args.seqs, metrics=('mota', 'idf1', 'num_switches'), reid_stats=reid_stats)
+        summary['fps'] = fps + [np.mean(fps)]
+        summary['detect_ratio'] = detect_ratio + [np.mean(detect_ratio)]
+        summary.index = [f'{name}/{index}' for index in summary.index]
+        rows.append(summary)
+
+    import pandas as pd
+    report = pd.concat(rows)
+    print(report.to_string(float_format=lambda x: f'{x:.3f}'))
+    if args.output:
+        report.to_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import objtracker
+from deep_sort.deep_sort import DeepSort
+
+
+class ConstantExtractor(object):
+    """每个框返回相同的单位特征，测试中不需要ReID模型"""
+    def extract(self, image, bbox_xyxy):
+        features = np.zeros((len(bbox_xyxy), 8), dtype=np.float32)
+        features[:, 0] = 1
+        return features
+
+    def extract_many(self, requests):
+        return [self.extract(image, bbox_xyxy) for image, bbox_xyxy in requests]
+
+
+class StaticDetector(object):
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+    def detect(self, im):
+        return im, [box + ('person', 0.9) for box in self.boxes]
+
+
+class AdaptiveStrideTest(unittest.TestCase):
+    def setUp(self):
+        self.image = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.tracker = DeepSort(None, n_init=3, extractor=ConstantExtractor())
+
+    def _run(self, detector, stride, num_frames):
+        detected, outputs = [], []
+        for _ in range(num_frames):
+            detected.append(stride.should_detect())
+            _, bboxes = objtracker.update_adaptive(detector, self.image, stride, self.tracker, render=False)
+            outputs.append(len(bboxes))
+        return detected, outputs
+
+    def test_empty_tracker_keeps_min_stride(self):
+        stride = objtracker.AdaptiveStride(1, 4)
+        detected, outputs = self._run(StaticDetector([]), stride, 5)
+        self.assertTrue(all(detected))
+        self.assertEqual(stride.stride, 1)
+
+    def test_tentative_tracks_are_confirmed_without_skipping(self):
+        stride = objtracker.AdaptiveStride(1, 4)
+        detected, outputs = self._run(StaticDetector([(100, 100, 150, 250)]), stride, 12)
+        # 确认之前每帧都检测，第 n_init 帧即输出轨迹
+        self.assertEqual(detected[:3], [True, True, True])
+        self.assertEqual(outputs.index(1), 2)
+        # 确认之后静止目标的检测间隔放大，且轨迹在跳过检测的帧中不丢失
+        self.assertGreater(stride.stride, 1)
+        self.assertIn(False, detected[3:])
+        self.assertTrue(all(count == 1 for count in outputs[2:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
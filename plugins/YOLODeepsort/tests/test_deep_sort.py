@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import torch
+from deep_sort.deep_sort import DeepSort
+from tests.test_adaptive_stride import ConstantExtractor
+
+
+class DeepSortInputTest(unittest.TestCase):
+    def setUp(self):
+        self.image = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    def _track(self, make_boxes):
+        tracker = DeepSort(None, n_init=1, extractor=ConstantExtractor())
+        outputs = None
+        for _ in range(2):
+            outputs = tracker.update(make_boxes(), [0.9, 0.8], self.image)
+        return outputs
+
+    def test_integer_boxes(self):
+        boxes = [[100, 150, 40, 80], [300, 200, 50, 100]]
+        expected = self._track(lambda: np.array(boxes, dtype=np.float64))
+        for make_boxes in (lambda: np.array(boxes, dtype=np.int64), lambda: boxes,
+                           lambda: torch.tensor(boxes)):
+            np.testing.assert_array_equal(self._track(make_boxes), expected)
+        self.assertEqual(len(expected), 2)
+
+    def _assert_empty_frame_ages_tracks(self, bbox_xywh, confidences):
+        tracker = DeepSort(None, n_init=1, extractor=ConstantExtractor())
+        self.assertEqual(len(tracker.update(bbox_xywh, confidences, self.image)), 0)
+        for _ in range(2):
+            tracker.update([[100, 150, 40, 80]], [0.9], self.image)
+        for age in (1, 2):
+            tracker.update(bbox_xywh, confidences, self.image)
+            self.assertEqual([track.time_since_update for track in tracker.tracker.tracks], [age])
+
+    def test_all_low_confidence_frame(self):
+        self._assert_empty_frame_ages_tracks([[100, 150, 40, 80]], [0.1])
+
+    def test_zero_detection_frame(self):
+        self._assert_empty_frame_ages_tracks(np.zeros((0, 4)), np.zeros(0))
+
+
+class ClassAwareNmsTest(unittest.TestCase):
+    def _track(self, classes):
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        tracker = DeepSort(None, n_init=1, nms_max_overlap=0.5, extractor=ConstantExtractor())
+        # 行人框完全位于车辆框内
+        boxes = np.array([[200., 200., 200., 120.], [220., 210., 30., 60.]])
+        for _ in range(2):
+            outputs = tracker.update(boxes, [0.9, 0.8], image, classes)
+        return outputs
+
+    def test_boxes_of_different_classes_are_kept(self):
+        self.assertEqual(len(self._track([2, 0])), 2)
+
+    def test_boxes_of_same_class_are_suppressed(self):
+        self.assertEqual(len(self._track([0, 0])), 1)
+        self.assertEqual(len(self._track(None)), 1)
+
+
+class FeatureReuseTest(unittest.TestCase):
+    def test_reused_features_are_not_added_to_gallery(self):
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        tracker = DeepSort(None, n_init=1, reid_reuse_frames=5, extractor=ConstantExtractor())
+        boxes = np.array([[100., 150., 40., 80.]])
+        for _ in range(20):
+            outputs = tracker.update(boxes, [0.9], image)
+        self.assertEqual(len(outputs), 1)
+        self.assertGreater(tracker.reid_stats['reused'], 0)
+        # gallery 中只有本帧新提取的特征，复用的特征不重复加入
+        gallery = tracker.tracker.metric.samples[int(outputs[0, 4])]
+        self.assertEqual(len(gallery), tracker.reid_stats['extracted'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from deep_sort.deep_sort.sort.nn_matching import NearestNeighborDistanceMetric, _pdist
+
+
+class UnboundedGalleryTest(unittest.TestCase):
+    def test_more_samples_than_initial_depth(self):
+        rng = np.random.default_rng(0)
+        features = rng.normal(size=(40, 8)).astype(np.float32)
+        metric = NearestNeighborDistanceMetric("euclidean", 1e9, budget=None)
+        for feature in features:
+            metric.partial_fit(feature[None], [1], [1])
+
+        np.testing.assert_array_equal(metric.samples[1], features)
+        queries = np.vstack([np.zeros((1, 8), np.float32), rng.normal(size=(3, 8))])
+        expected = np.maximum(0.0, _pdist(features, queries).min(axis=0))
+        np.testing.assert_allclose(metric.distance(queries, [1])[0], expected, rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
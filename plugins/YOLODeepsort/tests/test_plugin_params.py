@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+import numpy as np
+import YOLO_Deepsort
+
+
+class PedCarTrackParamsTest(unittest.TestCase):
+    def _run(self, **params):
+        plugin = YOLO_Deepsort.PedCarTrackPlugin()
+        seen = {}
+        def track_stream(params):
+            seen.update(params)
+            yield {'frame': 0, 'image': np.zeros((4, 4, 3), dtype=np.uint8), 'tracks': []}
+        plugin.track_stream = track_stream
+        with mock.patch.object(YOLO_Deepsort, 'cv2') as cv2:
+            plugin.pedCarTrack(dict(video_path='demo.mp4', **params))
+        return seen, cv2
+
+    def test_string_false_flags(self):
+        seen, cv2 = self._run(is_show='false', save_path='None')
+        cv2.imshow.assert_not_called()
+        cv2.imwrite.assert_not_called()
+        self.assertIsNone(seen['save_path'])
+        self.assertFalse(seen['render'])
+
+    def test_string_true_flags(self):
+        seen, cv2 = self._run(is_show='True', save_path='out/result.mp4')
+        cv2.imshow.assert_called_once()
+        self.assertEqual(seen['save_path'], 'out/result.mp4')
+        self.assertTrue(seen['render'])
+
+
+if __name__ == '__main__':
+    unittest.main()
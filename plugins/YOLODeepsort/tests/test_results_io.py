@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from deep_sort.utils.io import ResultsWriter, load_results_chunks
+
+
+class ResultsWriterNpyTest(unittest.TestCase):
+    def _run(self, filename, num_frames):
+        with ResultsWriter(filename, 'npy', flush_rows=3) as writer:
+            for frame_id in range(1, num_frames + 1):
+                writer.write(frame_id, np.ones((3, 4)), [1, 2, 3])
+
+    def test_rerun_into_same_prefix_drops_old_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'results.npy')
+            self._run(filename, 9)
+            self.assertEqual(len(load_results_chunks(filename)), 27)
+            self._run(filename, 2)
+            rows = load_results_chunks(filename)
+            self.assertEqual(len(rows), 6)
+            np.testing.assert_array_equal(np.unique(rows[:, 0]), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
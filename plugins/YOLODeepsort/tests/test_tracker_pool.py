@@ -0,0 +1,29 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import objtracker
+from objdetector import FrameDetections
+from tests.test_adaptive_stride import ConstantExtractor
+
+
+class FrameDetector(object):
+    def detect_frames(self, images):
+        return [FrameDetections([[100, 150, 140, 230]], [0.9], [0]) for _ in images]
+
+
+class TrackerPoolTest(unittest.TestCase):
+    def test_update_after_factory_release(self):
+        factory = objtracker.TrackerFactory(use_cuda=False, N_INIT=1)
+        factory.extractor = ConstantExtractor()
+        pool = objtracker.TrackerPool(FrameDetector(), factory)
+        frames = {'cam0': np.zeros((480, 640, 3), dtype=np.uint8), 'cam1': np.zeros((480, 640, 3), dtype=np.uint8)}
+        pool.update(frames, render=False)
+        factory.release()
+        results = pool.update(frames, render=False)
+        self.assertEqual([len(bboxes) for _, bboxes in results.values()], [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
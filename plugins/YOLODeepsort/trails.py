@@ -0,0 +1,103 @@
+## 目标轨迹的存储与绘制
+## 所有目标的轨迹保存在一个固定容量的环形缓冲数组中，每帧一次性追加、过期和绘制
+
+import numpy as np
+import cv2
+
+
+class TrailBuffer(object):
+    """
+    以 track_id 为下标的轨迹环形缓冲区：每个目标最多保留最近 length 个中心点，追加和过期都是O(1)。\n
+    目标连续 max_age 帧未出现时清空其轨迹（max_age=0 表示本帧未出现即清空），
+    清空前若给出 on_expire 回调，以 (track_id, 轨迹) 调用，轨迹格式同 trajectories()。\n
+    用法：\n
+        trails = TrailBuffer(length=50)
+        trails.update(list_bboxs)
+        trails.draw(image)
+    """
+    def __init__(self, length=50, max_age=0, color=(255, 0, 255), thickness=2, capacity=256, on_expire=None):
+        self.length = length
+        self.max_age = max_age
+        self.color = color
+        self.thickness = thickness
+        self.on_expire = on_expire
+        self._capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self._points = np.zeros((self._capacity, self.length, 2), dtype=np.float32) # 轨迹点 (x, y)
+        self._frames = np.zeros((self._capacity, self.length), dtype=np.int64) # 轨迹点所在帧号
+        self._head = np.zeros(self._capacity, dtype=np.int64) # 下一个写入位置（累计写入次数）
+        self._size = np.zeros(self._capacity, dtype=np.int64) # 当前保留的点数
+        self._last_seen = np.zeros(self._capacity, dtype=np.int64)
+        self._active = np.empty(0, dtype=np.int64) # 轨迹非空的 track_id
+        self.frame_idx = 0
+
+    def _grow(self, max_id):
+        capacity = self._capacity
+        while capacity <= max_id:
+            capacity *= 2
+        pad = capacity - self._capacity
+        self._points = np.pad(self._points, ((0, pad), (0, 0), (0, 0)))
+        self._frames = np.pad(self._frames, ((0, pad), (0, 0)))
+        self._head = np.pad(self._head, (0, pad))
+        self._size = np.pad(self._size, (0, pad))
+        self._last_seen = np.pad(self._last_seen, (0, pad))
+        self._capacity = capacity
+
+    def update(self, tracks, frame_idx=None):
+        """tracks 为跟踪结果 [(x1, y1, x2, y2, cls, track_id), ...] 或 (N,>=5) 数组（最后一列为 track_id）"""
+        self.frame_idx = self.frame_idx + 1 if frame_idx is None else frame_idx
+        if len(tracks):
+            boxes = np.array([track[:4] for track in tracks], dtype=np.float32).reshape(-1, 4)
+            ids = np.array([track[-1] for track in tracks], dtype=np.int64)
+        else:
+            boxes, ids = np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        if len(ids):
+            if ids.max() >= self._capacity:
+                self._grow(ids.max())
+            slots = self._head[ids] % self.length
+            self._points[ids, slots] = (boxes[:, :2] + boxes[:, 2:]) / 2
+            self._frames[ids, slots] = self.frame_idx
+            self._head[ids] += 1
+            self._size[ids] = np.minimum(self._size[ids] + 1, self.length)
+            self._last_seen[ids] = self.frame_idx
+
+        # 只检查上一帧仍有轨迹的目标
+        active = np.union1d(self._active, ids)
+        expired = active[self.frame_idx - self._last_seen[active] > self.max_age]
+        if len(expired):
+            if self.on_expire is not None:
+                for track_id, trajectory in self.trajectories(expired).items():
+                    self.on_expire(track_id, trajectory)
+            self._size[expired] = 0
+            self._head[expired] = 0
+        self._active = np.setdiff1d(active, expired, assume_unique=True)
+
+    def _ordered(self, ids):
+        """按时间顺序排列的 (len(ids), length) 环形缓冲下标，有效点位于每行末尾的 size 个"""
+        offsets = np.arange(self.length) - self.length
+        return (self._head[ids, None] + offsets) % self.length
+
+    def trajectories(self, ids=None):
+        """{track_id: (K,3) 数组，每行为 [帧号, x, y]，按时间顺序}；ids 为 None 时导出所有当前轨迹"""
+        ids = self._active if ids is None else np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return {}
+        order = self._ordered(ids)
+        points = self._points[ids[:, None], order]
+        frames = self._frames[ids[:, None], order]
+        return {int(track_id): np.column_stack([frames[i, self.length - size:], points[i, self.length - size:]])
+                for i, (track_id, size) in enumerate(zip(ids, self._size[ids]))}
+
+    def draw(self, image, color=None, thickness=None):
+        """用一次 cv2.polylines 画出所有长度大于1的轨迹"""
+        ids = self._active[self._size[self._active] > 1]
+        if not len(ids):
+            return image
+        points = self._points[ids[:, None], self._ordered(ids)].astype(np.int32)
+        polylines = [points[i, self.length - size:] for i, size in enumerate(self._size[ids])]
+        cv2.polylines(image, polylines, isClosed=False, color=color or self.color,
+                      thickness=thickness or self.thickness)
+        return image
@@ -0,0 +1,138 @@
+## 跟踪任务的视频读写
+## 解码、推理、编码分别在不同线程中进行，互相重叠
+
+import os
+import queue
+import threading
+import numpy as np
+import cv2
+
+
+def _hw_params(prop):
+    """硬件加速参数，OpenCV 版本不支持时返回空列表（软件解码/编码）"""
+    if hasattr(cv2, prop) and hasattr(cv2, 'VIDEO_ACCELERATION_ANY'):
+        return [getattr(cv2, prop), cv2.VIDEO_ACCELERATION_ANY]
+    return []
+
+
+class FrameReader(object):
+    """
+    后台解码线程：把视频帧预读到由 buffer_size 个可复用数组组成的环形缓冲区中。\n
+    迭代得到的帧是缓冲区的视图，使用完后必须按顺序调用 release() 归还，解码线程才会覆盖该位置；
+    缓冲区用完时解码线程阻塞等待，不会无限制地预读。\n
+    用法：\n
+        with FrameReader(path) as reader:
+            for frame in reader:
+                ...
+                reader.release()
+    """
+    def __init__(self, source, buffer_size=8, hw_accel=True):
+        params = _hw_params('CAP_PROP_HW_ACCELERATION') if hw_accel else []
+        self.capture = cv2.VideoCapture(source, cv2.CAP_ANY, params) if params else cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise IOError(f"无法打开视频：{source}")
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # 帧尺寸未知（部分摄像头）时不预分配，由 read() 自行分配
+        shape = (self.height, self.width, 3)
+        self._slots = [np.empty(shape, dtype=np.uint8) if self.width and self.height else None
+                       for _ in range(buffer_size)]
+        self._free = threading.Semaphore(buffer_size) # 空闲的缓冲区数量
+        self._ready = queue.Queue() # 已解码的帧，长度受 _free 限制
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self._thread.start()
+
+    def _decode_loop(self):
+        index = 0
+        try:
+            while True:
+                self._free.acquire()
+                if self._stopped.is_set():
+                    break
+                ok, frame = self.capture.read(self._slots[index % len(self._slots)])
+                if not ok:
+                    break
+                self._ready.put(frame)
+                index += 1
+        finally:
+            self._ready.put(None)
+
+    def __iter__(self):
+        while True:
+            frame = self._ready.get()
+            if frame is None:
+                return
+            yield frame
+
+    def release(self):
+        """归还最早取出、尚未归还的一帧所在的缓冲区"""
+        self._free.release()
+
+    def close(self):
+        self._stopped.set()
+        self._free.release() # 唤醒可能在等待空闲缓冲区的解码线程
+        self._thread.join()
+        self.capture.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameWriter(object):
+    """
+    后台编码线程：write() 把帧放入有界队列后立即返回，队列满时阻塞。\n
+    done 回调在该帧编码完成后调用，可传入 FrameReader.release 归还解码缓冲区。
+    """
+    def __init__(self, path, fps, size, fourcc='mp4v', queue_size=8, hw_accel=True):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        params = _hw_params('VIDEOWRITER_PROP_HW_ACCELERATION') if hw_accel else []
+        if params:
+            self.writer = cv2.VideoWriter(path, cv2.CAP_ANY, fourcc, fps, size, params)
+        else:
+            self.writer = cv2.VideoWriter(path, fourcc, fps, size)
+        self.path = path
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._thread.start()
+
+    def _encode_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, done = item
+            try:
+                if self._error is None:
+                    self.writer.write(frame)
+            except Exception as e:
+                self._error = e
+            finally:
+                if done is not None:
+                    done()
+
+    def write(self, frame, done=None):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((frame, done))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.release()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
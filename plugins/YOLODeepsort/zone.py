@@ -1,63 +1,167 @@
+from collections import namedtuple
 import numpy as np
 import cv2
-import objtracker
-from objdetector import Detector
+from trails import TrailBuffer
 
 VIDEO_PATH = './video/test_person.mp4'
 
-class Point:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-def isInsidePolygon(point, polygon):
-    isInside = False
-    currentVertex = -1
-    polygonLength = len(polygon)
-    previousVertex = polygonLength - 1
-    while currentVertex < polygonLength - 1:
-        currentVertex += 1
-        if ((polygon[currentVertex][0] <= point.x and point.x < polygon[previousVertex][0]) or 
-            (polygon[previousVertex][0] <= point.x and point.x < polygon[currentVertex][0])):
-            if (point.y < (polygon[previousVertex][1] - polygon[currentVertex][1]) * 
-                (point.x - polygon[currentVertex][0]) / 
-                (polygon[previousVertex][0] - polygon[currentVertex][0]) + polygon[currentVertex][1]):
-                isInside = not isInside
-        previousVertex = currentVertex
-    return isInside
-
-def drawAndFillPolygon(image, polygonPoints, fillColor):
-    # Convert the polygon points to NumPy array
-    polygonPoints = np.array([polygonPoints], dtype=np.int32)
-
-    # Create a mask with the same size as the image
-    mask = np.zeros_like(image)
-
-    # Fill the polygon with the specified color on the mask
-    mask = cv2.fillPoly(mask, [polygonPoints], color=fillColor)
-
-    # Draw the polygon contour on the original image
-    cv2.polylines(image, [polygonPoints], isClosed=True, color=(255, 0, 255), thickness=5)
-
-    # Overlay the mask and the original image
-    overlaidImage = cv2.addWeighted(image, 0.7, mask, 0.3, 0)
-
-    return overlaidImage
+ZoneEvent = namedtuple('ZoneEvent', ['frame', 'zone', 'track_id', 'event', 'dwell'])
+
+
+class ZoneMonitor(object):
+    """
+    多个多边形区域的入侵监测。\n
+    每种分辨率只栅格化一次：每个像素保存一个区域位掩码（第i位表示在第i个区域内，区域可以重叠，最多63个），
+    每帧用目标中心一次索引得到所有目标所在的区域；叠加用的半透明色块同样按分辨率缓存。\n
+    update() 返回进入/离开事件，离开事件的 dwell 为本次停留的帧数；目标消失视为离开。\n
+    状态保存在以 track_id 为下标的数组中，track_id 应为非负整数。
+    """
+    def __init__(self, zones, fill_color=(0, 155, 255), edge_color=(255, 0, 255), alpha=0.3, capacity=256):
+        if isinstance(zones, dict):
+            self.names = list(zones.keys())
+            zones = list(zones.values())
+        else:
+            self.names = list(range(len(zones)))
+        if len(zones) > 63:
+            raise ValueError("ZoneMonitor 最多支持63个区域")
+        self.polygons = [np.asarray(zone, dtype=np.int32).reshape(-1, 1, 2) for zone in zones]
+        self.fill_color = fill_color
+        self.edge_color = edge_color
+        self.alpha = alpha
+        self._bits = np.int64(1) << np.arange(len(self.polygons), dtype=np.int64)
+        self._shape = None # 当前掩码和叠加层对应的 (高, 宽)
+        self._capacity = capacity
+        self.reset()
+
+    def reset(self):
+        num_zones = len(self.polygons)
+        self._inside = np.zeros(self._capacity, dtype=np.int64) # 每个目标所在区域的位掩码
+        self._entered = np.zeros((num_zones, self._capacity), dtype=np.int64) # 进入区域时的帧号
+        self._dwell = np.zeros((num_zones, self._capacity), dtype=np.int64) # 已结束的停留累计帧数
+        self._active = np.empty(0, dtype=np.int64)
+        self.frame_idx = 0
+
+    def _build(self, shape):
+        """按分辨率栅格化区域位掩码，并生成叠加层"""
+        height, width = shape[:2]
+        self.mask = np.zeros((height, width), dtype=np.int64)
+        fill = np.zeros((height, width), dtype=np.uint8)
+        for bit, polygon in zip(self._bits, self.polygons):
+            fill[:] = 0
+            cv2.fillPoly(fill, [polygon], 1)
+            self.mask[fill.astype(bool)] |= bit
+        self._layer = np.zeros((height, width, 3), dtype=np.uint8)
+        self._layer[self.mask != 0] = self.fill_color
+        self._shape = (height, width)
+
+    def _grow(self, max_id):
+        capacity = self._capacity
+        while capacity <= max_id:
+            capacity *= 2
+        pad = capacity - self._capacity
+        self._inside = np.pad(self._inside, (0, pad))
+        self._entered = np.pad(self._entered, ((0, 0), (0, pad)))
+        self._dwell = np.pad(self._dwell, ((0, 0), (0, pad)))
+        self._capacity = capacity
+
+    def zones_of(self, points, shape):
+        """points 为 (N,2) 的 (x, y)，返回 (N, 区域数) 的布尔数组"""
+        if self._shape != tuple(shape[:2]):
+            self._build(shape)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        xs = np.clip(points[:, 0].astype(int), 0, self._shape[1] - 1)
+        ys = np.clip(points[:, 1].astype(int), 0, self._shape[0] - 1)
+        outside = (points[:, 0] < 0) | (points[:, 0] >= self._shape[1]) | (points[:, 1] < 0) | (points[:, 1] >= self._shape[0])
+        codes = np.where(outside, 0, self.mask[ys, xs])
+        return (codes[:, None] & self._bits) != 0
+
+    def update(self, tracks, shape, frame_idx=None):
+        """
+        tracks 为跟踪结果 [(x1, y1, x2, y2, cls, track_id), ...] 或 (N,>=5) 数组（最后一列为 track_id），shape 为图像尺寸。\n
+        返回 (inside, events)：inside 为 (N, 区域数) 的布尔数组，events 为 [ZoneEvent(frame, zone, track_id, 'enter'|'exit', dwell), ...]
+        """
+        self.frame_idx = self.frame_idx + 1 if frame_idx is None else frame_idx
+        if len(tracks):
+            boxes = np.array([track[:4] for track in tracks], dtype=np.float64).reshape(-1, 4)
+            ids = np.array([track[-1] for track in tracks], dtype=np.int64)
+        else:
+            boxes, ids = np.empty((0, 4)), np.empty(0, dtype=np.int64)
+        if len(ids) and ids.max() >= self._capacity:
+            self._grow(ids.max())
+        inside = self.zones_of((boxes[:, :2] + boxes[:, 2:]) / 2, shape)
+
+        # 本帧的位掩码，消失的目标视为不在任何区域内
+        gone = np.setdiff1d(self._active, ids, assume_unique=True)
+        all_ids = np.concatenate([ids, gone])
+        codes = np.concatenate([(inside * self._bits).sum(axis=1), np.zeros(len(gone), dtype=np.int64)])
+        changed = ((self._inside[all_ids] ^ codes)[:, None] & self._bits) != 0 # (M, 区域数)
+        entered = changed & ((codes[:, None] & self._bits) != 0)
+        exited = changed & ~entered
+
+        events = []
+        for det_idx, zone_idx in zip(*np.nonzero(entered | exited)):
+            track_id = all_ids[det_idx]
+            if entered[det_idx, zone_idx]:
+                self._entered[zone_idx, track_id] = self.frame_idx
+                events.append(ZoneEvent(self.frame_idx, self.names[zone_idx], int(track_id), 'enter', 0))
+            else:
+                dwell = int(self.frame_idx - self._entered[zone_idx, track_id])
+                self._dwell[zone_idx, track_id] += dwell
+                events.append(ZoneEvent(self.frame_idx, self.names[zone_idx], int(track_id), 'exit', dwell))
+        self._inside[all_ids] = codes
+        self._active = ids
+        return inside, events
+
+    def dwell_times(self, fps=None):
+        """
+        {区域名称: {track_id: 停留时长}}，包含仍在区域内的目标到当前帧为止的停留；
+        给出 fps 时单位为秒，否则为帧数
+        """
+        dwell = self._dwell.copy()
+        for zone_idx, bit in enumerate(self._bits):
+            current = np.nonzero(self._inside & bit)[0]
+            dwell[zone_idx, current] += self.frame_idx - self._entered[zone_idx, current]
+        return {name: {int(track_id): (float(dwell[zone_idx, track_id]) / fps if fps else int(dwell[zone_idx, track_id]))
+                       for track_id in np.nonzero(dwell[zone_idx])[0]}
+                for zone_idx, name in enumerate(self.names)}
+
+    def attach(self, stream):
+        """
+        包装逐帧产出 {'frame', 'image', 'tracks', ...} 的生成器（如 PedCarTrackPlugin.track_stream），
+        为每帧加上 'zones'（(N, 区域数) 的布尔数组）和 'zone_events'（本帧事件）后原样产出
+        """
+        for result in stream:
+            result['zones'], result['zone_events'] = self.update(result['tracks'], result['image'].shape, result.get('frame'))
+            yield result
+
+    def draw(self, image):
+        """画出区域边界并原地叠加区域色块（使用缓存的叠加层，不再每帧分配掩码）"""
+        if self._shape != tuple(image.shape[:2]):
+            self._build(image.shape)
+        cv2.polylines(image, self.polygons, isClosed=True, color=self.edge_color, thickness=5)
+        cv2.addWeighted(image, 1 - self.alpha, self._layer, self.alpha, 0, dst=image)
+        return image
+
 
 # 指定敏感区域的多边形顶点坐标
 polygonPoints = [[710, 200], [1110, 200], [810, 400], [410, 400]]
 color_light_yellow = (0, 155, 255)   # Light yellow color
 
-# Dictionary to store previous positions of each person
-person_positions = {}
 
 if __name__ == '__main__':
+    import objtracker
+    from objdetector import Detector
+
     capture = cv2.VideoCapture(VIDEO_PATH)
     if not capture.isOpened():
         print("Error opening video file.")
         exit()
 
+    fps = capture.get(cv2.CAP_PROP_FPS) or None
     detector = Detector()
+    monitor = ZoneMonitor([polygonPoints], fill_color=color_light_yellow)
+    # 每个目标最近50帧的中心点轨迹
+    trails = TrailBuffer(length=50, color=(0, 0, 255), thickness=3)
 
     while True:
         ret, frame = capture.read()
@@ -65,35 +169,27 @@ if __name__ == '__main__':
             break
 
         # Draw the boundary monitoring area 绘制敏感区域
-        frame = drawAndFillPolygon(frame, polygonPoints, color_light_yellow)
+        frame = monitor.draw(frame)
 
         # Update the tracker and get the bounding boxes of the persons
         output_image_frame, bbox_list = objtracker.update(detector, frame)
 
-        for bbox in bbox_list:
-            x1, y1, x2, y2, _, track_id = bbox
+        # 所有目标中心一次性判断是否在敏感区域内
+        inside, events = monitor.update(bbox_list, output_image_frame.shape)
+        for event in events:
+            print(event)
 
-            # Get the center point of the person
-            person_center = Point(x=(x1+x2)/2, y=(y1+y2)/2)
+        for bbox, in_zone in zip(bbox_list, inside):
+            x1, y1, x2, y2, _, track_id = bbox
 
             # Check if the person is inside the polygon
-            if isInsidePolygon(person_center, polygonPoints):
+            if in_zone.any():
                 warning_text = f'Warning! ID: {track_id}'
                 cv2.putText(output_image_frame, warning_text, (x1, y1 - 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 255), 2)
 
-            # Add the current person's position to the trail
-            if track_id in person_positions:
-                person_positions[track_id].append((person_center.x, person_center.y))
-                # Check if the trail length exceeds 50 frames, and remove the oldest position
-                if len(person_positions[track_id]) > 50:
-                    person_positions[track_id].pop(0)
-            else:
-                person_positions[track_id] = [(person_center.x, person_center.y)]
-
-            # Draw the trail for each person
-            trail_color = (0, 0, 255)  # Red color for the trail
-            for prev_pos in person_positions[track_id]:
-                cv2.circle(output_image_frame, (int(prev_pos[0]), int(prev_pos[1])), 3, trail_color, -1)
+        # Draw the trail for each person
+        trails.update(bbox_list)
+        trails.draw(output_image_frame)
 
         cv2.imshow('Boundary Monitoring', output_image_frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -101,3 +197,4 @@ if __name__ == '__main__':
 
     capture.release()
     cv2.destroyAllWindows()
+    print(monitor.dwell_times(fps))